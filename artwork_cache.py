@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Module: artwork_cache
+# Author: user extension
+# Created on: 18.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import io
+import hashlib
+import threading
+import requests
+import xbmc
+from concurrent.futures import ThreadPoolExecutor
+
+from search_cache import evict_directory, in_background
+
+CACHE_DIR = 'artwork'
+WORKERS = 4
+TIMEOUT = 10  # seconds per image
+
+class ArtworkCache:
+    """
+    Local copies of TMDb images.
+    A listing uses local files that already exist and queues the rest, the queue is
+    downloaded in the background once the listing is shown.
+    """
+
+    def __init__(self, profile, max_bytes=100 * 1024 * 1024):
+        self.path = os.path.join(profile, CACHE_DIR)
+        self.max_bytes = max_bytes
+        self._pending = []
+        self._lock = threading.Lock()
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+        except Exception as e:
+            xbmc.log(f'YaWSP Artwork Cache: Error creating directory: {str(e)}', level=xbmc.LOGERROR)
+
+    def _file(self, url):
+        ext = os.path.splitext(url.split('?')[0])[1] or '.jpg'
+        return os.path.join(self.path, hashlib.sha1(url.encode('utf-8')).hexdigest() + ext)
+
+    def resolve(self, url):
+        """Return the local file of url if it is cached, otherwise queue it and return url"""
+        if not url:
+            return url
+        file_path = self._file(url)
+        try:
+            # mtime marks the last use, eviction drops the least recently used images
+            os.utime(file_path, None)
+            return file_path
+        except OSError:
+            pass
+        if url not in self._pending:
+            self._pending.append(url)
+        return url
+
+    def download_pending(self):
+        """Download the queued images in the background"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        in_background(self._download_all, pending)
+
+    def _download_all(self, urls):
+        session = requests.Session()
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            list(executor.map(lambda url: self._download(session, url), urls))
+        self._evict()
+
+    def _download(self, session, url):
+        file_path = self._file(url)
+        tmp_path = f'{file_path}.{threading.get_ident()}.tmp'
+        try:
+            response = session.get(url, timeout=TIMEOUT)
+            response.raise_for_status()
+            with io.open(tmp_path, 'wb') as file:
+                file.write(response.content)
+            os.replace(tmp_path, file_path)
+        except Exception as e:
+            xbmc.log(f'YaWSP Artwork Cache: Error downloading {url}: {str(e)}', level=xbmc.LOGWARNING)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Drop the least recently used images until the cache fits into max_bytes"""
+        with self._lock:
+            try:
+                evict_directory(self.path, self.max_bytes)
+            except Exception as e:
+                xbmc.log(f'YaWSP Artwork Cache: Error evicting images: {str(e)}', level=xbmc.LOGERROR)
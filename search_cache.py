@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# Module: search_cache
+# Author: user extension
+# Created on: 18.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import io
+import json
+import time
+import hashlib
+import threading
+import xbmc
+
+from webshare_api import OK_STATUS
+
+CACHE_DIR = 'search_cache'
+# Only these parameters decide what Webshare returns, the token does not
+# carry marks the results a ranked page left over for the page it is set on
+KEY_PARAMS = ('what', 'category', 'sort', 'limit', 'offset', 'carry')
+
+def evict_directory(path, max_bytes):
+    """
+    Remove the files of path with the oldest mtime until the rest fits into max_bytes.
+    Files still being written (*.tmp) are neither counted nor removed.
+    """
+    entries = []
+    total = 0
+    for name in os.listdir(path):
+        if name.endswith('.tmp'):
+            continue
+        stat = os.stat(os.path.join(path, name))
+        entries.append((stat.st_mtime, stat.st_size, name))
+        total += stat.st_size
+    if total <= max_bytes:
+        return
+    entries.sort()
+    for mtime, size, name in entries:
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(path, name))
+        total -= size
+
+def in_background(target, *args):
+    # Not a daemon - the plugin invocation finishes the work after the listing is shown
+    threading.Thread(target=target, args=args).start()
+
+class SearchCache:
+    """Disk-backed cache of raw Webshare search responses"""
+
+    def __init__(self, profile, ttl=600, stale_ttl=0, max_bytes=20 * 1024 * 1024):
+        self.path = os.path.join(profile, CACHE_DIR)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._revalidating = set()
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+        except Exception as e:
+            xbmc.log(f'YaWSP Search Cache: Error creating directory: {str(e)}', level=xbmc.LOGERROR)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def key(self, params):
+        """Build a cache key from the normalized search parameters"""
+        normalized = {}
+        for name in KEY_PARAMS:
+            value = params.get(name, '')
+            normalized[name] = ' '.join(str(value if value is not None else '').lower().split())
+        return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.xml')
+
+    def get(self, params):
+        """Return (content, age in seconds) of a cached response or (None, None)"""
+        file_path = self._file(self.key(params))
+        try:
+            age = time.time() - os.path.getmtime(file_path)
+            with io.open(file_path, 'rb') as file:
+                return file.read(), age
+        except (OSError, IOError):
+            return None, None
+
+    def put(self, params, content):
+        """Store a successful response and keep the cache within max_bytes"""
+        if not content or OK_STATUS not in content:
+            return
+        file_path = self._file(self.key(params))
+        tmp_path = f'{file_path}.{threading.get_ident()}.tmp'
+        try:
+            with io.open(tmp_path, 'wb') as file:
+                file.write(content)
+            os.replace(tmp_path, file_path)
+        except Exception as e:
+            xbmc.log(f'YaWSP Search Cache: Error saving response: {str(e)}', level=xbmc.LOGERROR)
+            return
+        self._evict()
+
+    def _evict(self):
+        """Drop the oldest responses until the cache fits into max_bytes"""
+        with self._lock:
+            try:
+                evict_directory(self.path, self.max_bytes)
+            except Exception as e:
+                xbmc.log(f'YaWSP Search Cache: Error evicting responses: {str(e)}', level=xbmc.LOGERROR)
+
+    def fetch(self, params, loader):
+        """
+        Return the response content for params, calling loader() only when needed.
+        A stale response within stale_ttl is returned at once and refreshed in the background.
+        """
+        if not self.enabled:
+            return loader()
+
+        content, age = self.get(params)
+        if content is not None:
+            if age < self.ttl:
+                return content
+            if age < self.ttl + self.stale_ttl:
+                self._revalidate(params, loader)
+                return content
+
+        content = loader()
+        self.put(params, content)
+        return content
+
+    def stream(self, params, opener):
+        """
+        Like fetch, but yields the response in chunks. opener() returns an iterable of
+        chunks, a response read from the network is stored once it was fully consumed.
+        """
+        if not self.enabled:
+            for chunk in opener():
+                yield chunk
+            return
+
+        content, age = self.get(params)
+        if content is not None:
+            if age < self.ttl + self.stale_ttl:
+                if age >= self.ttl:
+                    self._revalidate(params, lambda: b''.join(opener()))
+                yield content
+                return
+
+        parts = []
+        for chunk in opener():
+            parts.append(chunk)
+            yield chunk
+        self.put(params, b''.join(parts))
+
+    def _revalidate(self, params, loader):
+        key = self.key(params)
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def refresh():
+            try:
+                self.put(params, loader())
+            except Exception as e:
+                xbmc.log(f'YaWSP Search Cache: Error refreshing response: {str(e)}', level=xbmc.LOGWARNING)
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        in_background(refresh)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Module: search_history
+# Author: user extension
+# Created on: 18.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import io
+import json
+import time
+import bisect
+import unidecode
+import xbmc
+from collections import OrderedDict
+
+LOG_FILE = 'search_history.log'
+LEGACY_FILE = 'search_history'
+COMPACT_SLACK = 100  # log lines beyond the history size before the log is rewritten
+
+def normalize(text):
+    """Lowercase ASCII form of a query with collapsed whitespace"""
+    return ' '.join(unidecode.unidecode(text).lower().split())
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchHistory:
+    """
+    Search history kept as an append-only log of add/remove records.
+    Storing or removing a query appends one line, the log is rewritten from the
+    current entries only once it grew COMPACT_SLACK lines past the history size.
+    """
+
+    def __init__(self, profile, size=20):
+        self.path = os.path.join(profile, LOG_FILE)
+        self.size = size
+        self._entries = OrderedDict()  # oldest first
+        self._lines = 0
+        legacy_path = os.path.join(profile, LEGACY_FILE)
+        if not os.path.exists(self.path) and os.path.exists(legacy_path):
+            self._import_legacy(legacy_path)
+        else:
+            self._load()
+
+    def _load(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf8') as file:
+                for line in file:
+                    self._lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    self._apply(record.get('op'), record.get('what'))
+        except (OSError, IOError):
+            pass
+
+    def _apply(self, op, what):
+        if not what:
+            return
+        if op == 'add':
+            self._entries.pop(what, None)
+            self._entries[what] = True
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        elif op == 'remove':
+            self._entries.pop(what, None)
+
+    def _append(self, op, what):
+        try:
+            with io.open(self.path, 'a', encoding='utf8') as file:
+                file.write(json.dumps({'op': op, 'what': what, 't': int(time.time())}) + '\n')
+            self._lines += 1
+        except Exception as e:
+            xbmc.log(f'YaWSP Search History: Error writing history: {str(e)}', level=xbmc.LOGERROR)
+            return
+        if self._lines > self.size + COMPACT_SLACK:
+            self.compact()
+
+    def add(self, what):
+        if what:
+            self._apply('add', what)
+            self._append('add', what)
+
+    def remove(self, what):
+        if what in self._entries:
+            self._apply('remove', what)
+            self._append('remove', what)
+
+    def entries(self):
+        """Return the stored queries, the most recent first"""
+        return list(reversed(self._entries))
+
+    def compact(self):
+        """Rewrite the log with one add record per current entry"""
+        tmp_path = self.path + '.tmp'
+        try:
+            with io.open(tmp_path, 'w', encoding='utf8') as file:
+                for what in self._entries:
+                    file.write(json.dumps({'op': 'add', 'what': what}) + '\n')
+            os.replace(tmp_path, self.path)
+            self._lines = len(self._entries)
+        except Exception as e:
+            xbmc.log(f'YaWSP Search History: Error compacting history: {str(e)}', level=xbmc.LOGERROR)
+
+    def _import_legacy(self, legacy_path):
+        """Take over the old JSON list (most recent first) and remove it"""
+        try:
+            with io.open(legacy_path, 'r', encoding='utf8') as file:
+                history = json.load(file)
+            for what in reversed(history):
+                self._apply('add', what)
+            self.compact()
+            os.remove(legacy_path)
+        except Exception as e:
+            xbmc.log(f'YaWSP Search History: Error importing history: {str(e)}', level=xbmc.LOGERROR)
+
+class SuggestionIndex:
+    """
+    In-memory index of suggestion texts. Prefix matches come from a sorted list of
+    the normalized texts and their words, anything else is ranked by shared trigrams.
+    Texts added first are preferred among equal matches.
+    """
+
+    def __init__(self, texts=()):
+        self._texts = []
+        self._seen = set()
+        self._prefixes = []  # sorted (normalized text or word suffix of it, text id)
+        self._trigrams = {}
+        self.extend(texts)
+
+    def extend(self, texts):
+        added = False
+        for text in texts:
+            key = normalize(text)
+            if not key or key in self._seen:
+                continue
+            self._seen.add(key)
+            text_id = len(self._texts)
+            self._texts.append(text)
+            words = key.split(' ')
+            for i in range(len(words)):
+                self._prefixes.append((' '.join(words[i:]), text_id))
+            for gram in trigrams(key):
+                self._trigrams.setdefault(gram, []).append(text_id)
+            added = True
+        if added:
+            self._prefixes.sort()
+
+    def suggest(self, text, limit=10, fuzzy=True):
+        """Return up to limit texts matching text, prefix matches first and then trigram matches if fuzzy"""
+        key = normalize(text)
+        if not key:
+            return self._texts[:limit]
+
+        prefixed = set()
+        start = bisect.bisect_left(self._prefixes, (key, -1))
+        for prefix, text_id in self._prefixes[start:]:
+            if not prefix.startswith(key):
+                break
+            prefixed.add(text_id)
+        result = sorted(prefixed)
+
+        if fuzzy and len(result) < limit:
+            grams = trigrams(key)
+            shared = {}
+            for gram in grams:
+                for text_id in self._trigrams.get(gram, ()):
+                    if text_id not in prefixed:
+                        shared[text_id] = shared.get(text_id, 0) + 1
+            # At least half of the trigrams of the typed text have to match
+            threshold = max(2, len(grams) // 2)
+            fuzzy = sorted((text_id for text_id, count in shared.items() if count >= threshold),
+                           key=lambda text_id: (-shared[text_id], text_id))
+            result.extend(fuzzy)
+
+        return [self._texts[text_id] for text_id in result[:limit]]
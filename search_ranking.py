@@ -1,148 +1,352 @@
 import datetime
+import heapq
 import re
+import threading
+from collections import OrderedDict
 
 import tmdb
 
-def score_result(file_info, search_query=None, original_query=None):
-    """
-    Score a search result based on quality indicators in filename and metadata.
-    Higher score = better quality/more relevant result.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Release name features, one named group each, combined into a single alternation that
+# is scanned once over the lowercase name. Boundaries are lookarounds, so neighbouring
+# tokens sharing a separator are all found. online comes before poor_audio - the 'line'
+# inside it is consumed, which does not matter as online cancels that penalty anyway.
+FEATURE_PATTERNS = (
+    ('res_2160', r'(?<![0-9])(?:2160p|4k|uhd)(?![0-9])'),
+    ('res_1080', r'(?<![0-9])1080p(?![0-9])'),
+    ('res_720', r'(?<![0-9])720p(?![0-9])'),
+    ('res_480', r'(?<![0-9])480p(?![0-9])'),
+    ('bluray', r'blu[\s\.\-]*ray|bdrip|bd[\s\.\-]*rip'),
+    ('web', r'web[\s\.\-]*rip|web[\s\.\-]*dl'),
+    ('dvd', r'dvdrip|dvd[\s\.\-]*rip'),
+    ('hdtv', r'hdtv'),
+    ('hq_audio', r'atmos|dolby|dts|aac5'),
+    ('hevc', r'x265|hevc|h265'),
+    ('avc', r'x264|h264'),
+    ('good_group', r'sparks|geckos|yify|yts|rarbg|ctrlhd'),
+    ('cam', r'(?<![a-z])cam(?![a-z])|camrip'),
+    ('ts', r'(?<![a-z])ts(?![a-z])|telesync'),
+    ('hdcam', r'hdcam'),
+    ('screener', r'screener|scr'),
+    ('hardcoded', r'hardcoded|hc'),
+    ('sub', r'sub'),
+    ('proper', r'proper|repack'),
+    ('online', r'online'),
+    ('poor_audio', r'(?<![a-z])mic(?![a-z])|line'),
+)
+FEATURE_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in FEATURE_PATTERNS))
+YEAR_RE = re.compile(r'\b(19|20)\d{2}\b')
+
+# Tiers score only their best match, the first feature found wins
+RESOLUTION_SCORES = (('res_2160', 100), ('res_1080', 80), ('res_720', 60), ('res_480', 20))
+SOURCE_SCORES = (('bluray', 50), ('web', 40), ('dvd', 30), ('hdtv', 20))
+CODEC_SCORES = (('hevc', 15), ('avc', 10))
+RESOLUTION_LEVELS = {'res_480': 1, 'res_720': 2, 'res_1080': 3, 'res_2160': 4}
+LOW_QUALITY = frozenset(('cam', 'ts', 'hdcam'))
+# Only the top results are enriched with TMDb metadata to minimize API calls
+ENRICH_LIMIT = 20
+# Common words that don't help in matching
+STOP_WORDS = frozenset(('the', 'and', 'for', 'with'))
+NONE_QUERY = '%#none#%'
+
+class PreparedQuery:
+    """A search query split once into the parts the relevance scoring needs"""
     
-    Args:
-        file_info (dict): Dictionary with file information
-        search_query (str, optional): The actual search query used (could be TMDb enhanced)
-        original_query (str, optional): The original user query
-        
-    Returns:
-        float: Quality and relevance score (higher is better)
-    """
-    if not file_info or 'name' not in file_info:
-        return 0
-        
-    name = file_info['name'].lower()
-    score = 0
+    __slots__ = ('text', 'terms', 'phrase', 'year')
     
-    # Resolution scoring
-    if re.search(r'[^0-9](2160p|4k|uhd)[^0-9]', name):
-        score += 100
-    elif re.search(r'[^0-9]1080p[^0-9]', name):
-        score += 80
-    elif re.search(r'[^0-9]720p[^0-9]', name):
-        score += 60
-    elif re.search(r'[^0-9]480p[^0-9]', name):
-        score += 20
-    
-    # Source quality scoring
-    if re.search(r'(blu[\s\.\-]*ray|bdrip|bd[\s\.\-]*rip)', name):
-        score += 50
-    elif re.search(r'(web[\s\.\-]*rip|web[\s\.\-]*dl)', name):
-        score += 40
-    elif re.search(r'(dvdrip|dvd[\s\.\-]*rip)', name):
-        score += 30
-    elif re.search(r'hdtv', name):
-        score += 20
-    
-    # Audio quality
-    if re.search(r'(atmos|dolby|dts|aac5)', name):
-        score += 15
+    def __init__(self, query):
+        self.text = query.lower()
+        self.terms = [t for t in self.text.split() if len(t) > 2 and t not in STOP_WORDS]
+        self.phrase = ' '.join(self.terms)
+        year_match = YEAR_RE.search(query)
+        self.year = year_match.group(0) if year_match else None
+
+def prepare_query(query):
+    """Return a PreparedQuery, or None when there is nothing to match against"""
+    if not query or query.lower() == NONE_QUERY:
+        return None
+    return PreparedQuery(query)
+
+class LRUCache:
+    """Bounded least recently used mapping with hit and miss counters"""
     
-    # Encoding quality
-    if re.search(r'x265|hevc|h265', name):
-        score += 15
-    elif re.search(r'x264|h264', name):
-        score += 10
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+# The caches live as long as the Python process. A plugin call is a new process, so
+# they only pay off where one process scores the same names repeatedly - the
+# background service refreshing series, or a scan ranking files of many episodes.
+FEATURE_CACHE = LRUCache(4096)
+RELEVANCE_CACHE = LRUCache(8192)
+
+def extract_features(name):
+    """Return the set of release features found in a lowercase filename"""
+    return frozenset(match.lastgroup for match in FEATURE_RE.finditer(name))
+
+def name_features(name):
+    """Return (features, quality score) of a lowercase filename, memoized by the name"""
+    entry = FEATURE_CACHE.get(name)
+    if entry is None:
+        features = extract_features(name)
+        entry = (features, quality_score(features))
+        FEATURE_CACHE.put(name, entry)
+    return entry
+
+def cached_relevance(name, query):
+    """relevance_score memoized by the lowercase filename and the prepared query"""
+    key = (name, query.text)
+    score = RELEVANCE_CACHE.get(key)
+    if score is None:
+        score = relevance_score(name, query)
+        RELEVANCE_CACHE.put(key, score)
+    return score
+
+def cache_stats():
+    """Hit and miss counters of the scoring caches, for tuning their size"""
+    return {'features': FEATURE_CACHE.stats(), 'relevance': RELEVANCE_CACHE.stats()}
+
+def tier_score(features, tiers):
+    for feature, points in tiers:
+        if feature in features:
+            return points
+    return 0
+
+def resolution_level(features):
+    """0 for unknown, 1 = 480p up to 4 = 2160p"""
+    return max((RESOLUTION_LEVELS[f] for f in features if f in RESOLUTION_LEVELS), default=0)
+
+def quality_score(features):
+    """Query independent score of the release quality"""
+    score = tier_score(features, RESOLUTION_SCORES)
+    score += tier_score(features, SOURCE_SCORES)
+    score += tier_score(features, CODEC_SCORES)
     
+    if 'hq_audio' in features:
+        score += 15
     # Release group scoring - known good groups
-    if re.search(r'(sparks|geckos|yify|yts|rarbg|ctrlhd)', name):
+    if 'good_group' in features:
         score += 10
     
     # Penalize low quality indicators
-    if re.search(r'[^a-z]cam[^a-z]|camrip', name):
+    if 'cam' in features:
         score -= 100
-    if re.search(r'[^a-z]ts[^a-z]|telesync', name):
+    if 'ts' in features:
         score -= 80
-    if re.search(r'hdcam', name):
+    if 'hdcam' in features:
         score -= 50
-    if re.search(r'screener|scr', name):
+    if 'screener' in features:
         score -= 40
-    if re.search(r'hardcoded|hc', name) and re.search(r'sub', name):
+    if 'hardcoded' in features and 'sub' in features:
         score -= 20  # Hardcoded subtitles
     
     # Boost for proper releases
-    if re.search(r'proper|repack', name):
+    if 'proper' in features:
         score += 10
-        
+    
     # Penalize poor audio
-    if re.search(r'[^a-z]mic[^a-z]|line', name) and not re.search(r'online', name):
+    if 'poor_audio' in features and 'online' not in features:
         score -= 30
     
-    # File size consideration (larger files tend to be better quality for video)
-    try:
-        if 'size' in file_info:
-            size_mb = int(file_info['size']) / (1024 * 1024)  # Convert to MB
-            # Give a small bonus for larger files (max 25 points)
-            score += min(size_mb / 1000, 25)
-    except (ValueError, TypeError):
-        pass
+    return score
+
+def score_result(file_info, search_query=None, original_query=None, features=None):
+    """
+    Score a search result based on quality indicators in filename and metadata.
+    Higher score = better quality/more relevant result.
     
-    # Title relevance scoring - use the query that's most relevant
-    query_to_score = search_query or original_query
-    if query_to_score and query_to_score.lower() != '%#none#%':
-        search_terms = query_to_score.lower().split()
-        
-        # Remove common words that don't help in matching
-        search_terms = [t for t in search_terms if len(t) > 2 and t not in ('the', 'and', 'for', 'with')]
-        
-        # Exact title match (case insensitive)
-        if query_to_score.lower() in name:
-            score += 200
-        
-        # Count matching terms and their positions
-        matched_terms = 0
-        for i, term in enumerate(search_terms):
-            if term in name:
-                matched_terms += 1
-                # Terms at the beginning of the query are more important
-                term_weight = 1.0 - (i * 0.1) if i < 5 else 0.5
-                score += 30 * term_weight
-        
-        # Perfect match (all terms in the correct order)
-        if matched_terms == len(search_terms) and ' '.join(search_terms) in name:
-            score += 100
+    Args:
+        file_info (FileRecord): File from a Webshare listing
+        search_query (str, optional): The actual search query used (could be TMDb enhanced)
+        original_query (str, optional): The original user query
+        features (frozenset, optional): Already extracted release features of the filename
         
-        # Boost if the title starts with the search query
-        if any(name.startswith(term) for term in search_terms):
-            score += 50
-            
-        # Penalize results with many extra words (likely less relevant)
-        name_words = len(name.split())
-        query_words = len(search_terms)
-        if name_words > query_words * 3:
-            score -= min((name_words - query_words*2) * 5, 50)
+    Returns:
+        float: Quality and relevance score (higher is better)
+    """
+    if not file_info or 'name' not in file_info:
+        return 0
         
-        # Year matching bonus (if year is in search query)
-        year_match = re.search(r'\b(19|20)\d{2}\b', query_to_score)
-        if year_match:
-            year = year_match.group(0)
-            if year in name:
-                score += 50
+    name = file_info['name'].lower()
+    score = 0
+    
+    # Release quality from the filename
+    if features is None:
+        score += name_features(name)[1]
+    else:
+        score += quality_score(features)
+    
+    # File size consideration (larger files tend to be better quality for video)
+    score += size_score(file_info.size)
+    
+    # Title relevance scoring - use the query that's most relevant
+    query = prepare_query(search_query or original_query)
+    if query is not None:
+        score += cached_relevance(name, query)
 
     # Boost results found via TMDb enhancement
     # This should apply regardless of whether we have search queries
-    if file_info.get('search_priority', 0) == 1:  # First TMDb variant
-        score += 75
-    elif file_info.get('search_priority', 0) > 1:  # Other TMDb variants
-        score += 25
+    score += priority_score(file_info.search_priority)
     
     return score
 
-def should_include_result(file_info, filters):
+def size_score(size):
+    """Give a small bonus for larger files (max 25 points)"""
+    if not size:
+        return 0
+    size_mb = size / (1024 * 1024)  # Convert to MB
+    return min(size_mb / 1000, 25)
+
+def priority_score(priority):
+    if priority == 1:  # First TMDb variant
+        return 75
+    elif priority > 1:  # Other TMDb variants
+        return 25
+    return 0
+
+def relevance_score(name, query):
+    """
+    Score how well a lowercase filename matches a prepared query
+    
+    Args:
+        name (str): Lowercase filename
+        query (PreparedQuery): The query to match against
+        
+    Returns:
+        float: Relevance score
+    """
+    score = 0
+    search_terms = query.terms
+    
+    # Exact title match (case insensitive)
+    if query.text in name:
+        score += 200
+    
+    # Count matching terms and their positions
+    matched_terms = 0
+    for i, term in enumerate(search_terms):
+        if term in name:
+            matched_terms += 1
+            # Terms at the beginning of the query are more important
+            term_weight = 1.0 - (i * 0.1) if i < 5 else 0.5
+            score += 30 * term_weight
+    
+    # Perfect match (all terms in the correct order)
+    if matched_terms == len(search_terms) and query.phrase in name:
+        score += 100
+    
+    # Boost if the title starts with the search query
+    if any(name.startswith(term) for term in search_terms):
+        score += 50
+        
+    # Penalize results with many extra words (likely less relevant)
+    name_words = len(name.split())
+    query_words = len(search_terms)
+    if name_words > query_words * 3:
+        score -= min((name_words - query_words*2) * 5, 50)
+    
+    # Year matching bonus (if year is in search query)
+    if query.year and query.year in name:
+        score += 50
+    
+    return score
+
+def score_results(files, search_query=None, quality=None):
+    """
+    Score a whole candidate list at once.
+    
+    The query of every distinct search variant is prepared only once. Each score part
+    is computed as a column over all files and the columns are summed - with numpy
+    when it is available, otherwise in plain Python.
+    
+    Args:
+        files (list): FileRecords to score
+        search_query (str, optional): The original user query, used for files without a search variant
+        quality (list, optional): Already computed quality score of each file, in the same order
+        
+    Returns:
+        list: Score of each file, in the order of files
+    """
+    names = [f.name.lower() for f in files]
+    
+    queries = {}
+    relevance = []
+    for f, name in zip(files, names):
+        query_text = f.search_variant or search_query
+        if query_text not in queries:
+            queries[query_text] = prepare_query(query_text)
+        query = queries[query_text]
+        relevance.append(cached_relevance(name, query) if query is not None else 0)
+    
+    if quality is None:
+        quality = [name_features(name)[1] for name in names]
+    
+    if numpy is not None and files:
+        sizes = numpy.array([f.size or 0 for f in files], dtype=float)
+        priorities = numpy.array([f.search_priority for f in files])
+        total = numpy.array(quality, dtype=float) + numpy.array(relevance, dtype=float)
+        total += numpy.minimum(sizes / (1024 * 1024) / 1000, 25)
+        total += numpy.where(priorities == 1, 75, numpy.where(priorities > 1, 25, 0))
+        return total.tolist()
+    
+    return [q + r + size_score(f.size) + priority_score(f.search_priority)
+            for f, q, r in zip(files, quality, relevance)]
+
+def rank_results(files, search_query=None):
+    """
+    Return the indexes of files ordered from the best to the worst score.
+    Files with equal scores keep their original order.
+    """
+    scores = score_results(files, search_query)
+    return order_scores(scores)
+
+def order_scores(scores):
+    if numpy is not None and scores:
+        return numpy.argsort(-numpy.array(scores), kind='stable').tolist()
+    return sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+
+def should_include_result(file_info, filters, features=None):
     """
     Check if a result should be included based on user filters
     
     Args:
-        file_info (dict): Dictionary with file information
+        file_info (FileRecord): File from a Webshare listing
         filters (dict): Dictionary with filter settings
+        features (frozenset, optional): Already extracted release features of the filename
         
     Returns:
         bool: True if the result should be included, False otherwise
@@ -150,36 +354,26 @@ def should_include_result(file_info, filters):
     if not file_info or 'name' not in file_info:
         return False
         
-    name = file_info['name'].lower()
+    if features is None:
+        features = name_features(file_info['name'].lower())[0]
     
     # Apply resolution filter
     min_res = filters.get('min_resolution', 0)
-    if min_res == 1 and not any(res in name for res in ['480p', '720p', '1080p', '2160p', '4k', 'uhd']):
-        return False
-    elif min_res == 2 and not any(res in name for res in ['720p', '1080p', '2160p', '4k', 'uhd']):
-        return False
-    elif min_res == 3 and not any(res in name for res in ['1080p', '2160p', '4k', 'uhd']):
-        return False
-    elif min_res == 4 and not any(res in name for res in ['2160p', '4k', 'uhd']):
+    if min_res and resolution_level(features) < min_res:
         return False
     
     # Exclude CAM/TS if enabled
-    if filters.get('exclude_cam', True):
-        low_quality_terms = ['cam', 'camrip', '[cam]', 'ts', 'telesync', 'hdcam']
-        if any(term in name for term in low_quality_terms):
-            return False
+    if filters.get('exclude_cam', True) and not LOW_QUALITY.isdisjoint(features):
+        return False
     
     # Filter by age if set
     max_age = filters.get('max_age', 0)
-    if max_age > 0 and 'created' in file_info:
-        try:
-            created_date = datetime.datetime.strptime(file_info['created'], '%Y-%m-%d %H:%M:%S')
-            now = datetime.datetime.now()
-            age_months = (now.year - created_date.year) * 12 + (now.month - created_date.month)
-            if age_months > max_age:
-                return False
-        except (ValueError, TypeError):
-            pass
+    if max_age > 0 and file_info.created is not None:
+        created_date = file_info.created
+        now = datetime.datetime.now()
+        age_months = (now.year - created_date.year) * 12 + (now.month - created_date.month)
+        if age_months > max_age:
+            return False
     
     return True
 
@@ -188,35 +382,66 @@ def filter_and_sort_results(files, search_query=None, filters=None, tmdb_api=Non
     Filter and sort search results by quality and relevance
     
     Args:
-        files (list): List of file dictionaries to sort
+        files (iterable): FileRecords to sort
         search_query (str, optional): The original user search query
         filters (dict, optional): Dictionary with filter settings
         tmdb_api (TMDbAPI, optional): TMDb API instance for metadata enrichment
         
     Returns:
-        list: Filtered and sorted list of file dictionaries
+        list: Filtered and sorted list of FileRecords
     """
     if filters is None:
         filters = {}
-        
-    # Filter results
-    filtered_files = [f for f in files if should_include_result(f, filters)]
-    
-    # Sort results by quality score
-    # Pass both the search variant used and the original query
-    sorted_files = sorted(filtered_files, 
-                  key=lambda x: score_result(
-                      x, 
-                      search_query=x.get('search_variant', search_query), 
-                      original_query=search_query
-                  ), 
-                  reverse=True)
+    
+    candidates, scores = filter_and_score(files, search_query, filters)
+    sorted_files = [candidates[i] for i in order_scores(scores)]
     
     # Enrich with TMDb metadata if API is available
     if tmdb_api and filters.get('enrich_metadata', True):
-        for i, file_info in enumerate(sorted_files):
-            # Only enrich the top N results to minimize API calls
-            if i < 20:  # Process only top 20 results
-                sorted_files[i] = tmdb_api.enrich_result(file_info)
+        # Only enrich the top N results to minimize API calls, the lookups run in parallel
+        tmdb_api.enrich_results(sorted_files[:ENRICH_LIMIT])
+    
+    return sorted_files
+
+def select_results(files, limit, search_query=None, filters=None, tmdb_api=None):
+    """
+    Filter the results and pick the limit best of them for one listing page
+    
+    Args:
+        files (iterable): FileRecords to rank
+        limit (int): Number of results shown on the page
+        search_query (str, optional): The original user search query
+        filters (dict, optional): Dictionary with filter settings
+        tmdb_api (TMDbAPI, optional): TMDb API instance for metadata enrichment
+        
+    Returns:
+        tuple: (page, rest) - page holds the best results sorted and enriched, rest the
+        other filtered results unsorted in their original order
+    """
+    if filters is None:
+        filters = {}
+    
+    candidates, scores = filter_and_score(files, search_query, filters)
+    # Partial selection - only the head is ordered, like a stable sort of the scores cut at limit
+    best = heapq.nlargest(limit, range(len(scores)), key=scores.__getitem__)
+    page = [candidates[i] for i in best]
+    chosen = set(best)
+    rest = [f for i, f in enumerate(candidates) if i not in chosen]
+    
+    if tmdb_api and filters.get('enrich_metadata', True):
+        tmdb_api.enrich_results(page[:ENRICH_LIMIT])
+    
+    return page, rest
+
+def filter_and_score(files, search_query, filters):
+    """Return the files passing filters and their scores as two lists"""
+    # Extract the release features once, filtering and scoring both read them
+    featured = [(f, name_features(f.name.lower())) for f in files if f.name]
+    
+    # Filter results
+    filtered_files = [(f, quality) for f, (features, quality) in featured if should_include_result(f, filters, features)]
     
-    return sorted_files
\ No newline at end of file
+    # The whole list is scored in one batch
+    # Each file is matched against the search variant that found it, or the original query
+    candidates = [f for f, quality in filtered_files]
+    return candidates, score_results(candidates, search_query, [quality for f, quality in filtered_files])
\ No newline at end of file
@@ -5,13 +5,16 @@
 # License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
 
 import os
-import io
 import re
-import json
 import xbmc
 import xbmcaddon
 import xbmcgui
-import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import search_ranking
+from series_store import SeriesStore
+from webshare_parser import ResponseReader, FileRecord
 
 try:
     from urllib import urlencode
@@ -25,35 +28,128 @@ try:
 except ImportError:
     from xbmcvfs import translatePath
 
-# Regular expressions for detecting episode patterns
-EPISODE_PATTERNS = [
-    r'[Ss](\d+)[Ee](\d+)',  # S01E01 format
-    r'(\d+)x(\d+)',         # 1x01 format
-    r'[Ee]pisode\s*(\d+)',  # Episode 1 format
-    r'[Ee]p\s*(\d+)',       # Ep 1 format
-    r'[Ee](\d+)',           # E1 format
-    r'(\d+)\.\s*(\d+)'      # 1.01 format
-]
+# Episode patterns as one anchored alternation: a branch is tried over the whole name
+# before the next one, so the first pattern that matches anywhere wins.
+# S01E01 also takes a range (S01E01-E02, S01E01E02, S01E01-02) of multi-episode files.
+EPISODE_RE = re.compile(
+    r'^(?:'
+    r'.*?s(?P<s_season>\d+)e(?P<s_episode>\d+)(?:-?e(?P<s_last>\d+)|-(?P<s_last_short>\d+)(?!\d*p))?'  # S01E01 format
+    r'|.*?(?P<x_season>\d+)x(?P<x_episode>\d+)'  # 1x01 format
+    r'|.*?episode\s*(?P<episode>\d+)'  # Episode 1 format
+    r'|.*?ep\s*(?P<ep>\d+)'  # Ep 1 format
+    r'|.*?e(?P<e>\d+)'  # E1 format
+    r'|.*?(?P<d_season>\d+)\.\s*(?P<d_episode>\d+)'  # 1.01 format
+    r')')
+SEASON_RE = re.compile(r'season\s*(\d+)')
+NUMBER_RE = re.compile(r'(\d+)')
+EPISODE_KEYWORDS = ('episode', 'season', 'series', 'ep', 'complete', 'serie', 'disk')
+MAX_RANGE = 10  # longest multi-episode range accepted
+
+# Queries of a scan running at the same time
+SCAN_WORKERS = 4
+# Result pages of one query
+PAGE_SIZE = 100
+PAGES_AHEAD = 2  # pages of a query requested at the same time
+DEFAULT_MAX_PAGES = 5
+# Other files of an episode kept as playback fallbacks
+MAX_ALTERNATES = 3
+# Incremental refresh pages through the newest files of the series
+REFRESH_MAX_PAGES = 5
+
+class EpisodeMatch:
+    """What EpisodeMatcher found in a filename, season is None when it is not placeable"""
+    
+    __slots__ = ('likely', 'season', 'episode', 'last_episode')
+    
+    def __init__(self, likely, season=None, episode=None, last_episode=None):
+        self.likely = likely
+        self.season = season
+        self.episode = episode
+        self.last_episode = last_episode if last_episode is not None else episode
+    
+    def episodes(self):
+        """All episode numbers covered by the file"""
+        return range(self.episode, self.last_episode + 1)
+
+class EpisodeMatcher:
+    """Episode detection for one series, compiled once per scan"""
+    
+    def __init__(self, series_name):
+        self.series_name = series_name.lower()
+    
+    def match(self, filename):
+        """
+        Return an EpisodeMatch for filename. likely tells whether the file is an episode
+        of the series at all, season and episode are set when it could be placed.
+        """
+        name = filename.lower()
+        if self.series_name not in name:
+            return EpisodeMatch(False)
+        
+        # Remove series name and clean up the string
+        cleaned = name.replace(self.series_name, '').strip()
+        found = EPISODE_RE.match(cleaned)
+        if found:
+            return self._placed(found, True)
+        
+        likely = any(keyword in name for keyword in EPISODE_KEYWORDS) or EPISODE_RE.match(name) is not None
+        
+        # If no pattern matched, try to infer from the filename
+        if 'season' in cleaned or 'serie' in cleaned:
+            season_match = SEASON_RE.search(cleaned)
+            if season_match:
+                ep_match = NUMBER_RE.search(cleaned.replace(season_match.group(0), ''))
+                if ep_match:
+                    return EpisodeMatch(likely, int(season_match.group(1)), int(ep_match.group(1)))
+        
+        return EpisodeMatch(likely)
+    
+    def _placed(self, found, likely):
+        groups = found.groupdict()
+        if groups['s_season'] is not None:
+            season, episode = int(groups['s_season']), int(groups['s_episode'])
+            last = groups['s_last'] or groups['s_last_short']
+            last = int(last) if last is not None else None
+            if last is not None and not episode < last <= episode + MAX_RANGE:
+                last = None
+            return EpisodeMatch(likely, season, episode, last)
+        for season_group, episode_group in (('x_season', 'x_episode'), ('d_season', 'd_episode')):
+            if groups[season_group] is not None:
+                return EpisodeMatch(likely, int(groups[season_group]), int(groups[episode_group]))
+        # Assume season 1 if only episode number is found
+        episode = groups['episode'] or groups['ep'] or groups['e']
+        return EpisodeMatch(likely, 1, int(episode))
 
 class SeriesManager:
-    def __init__(self, addon, profile):
+    def __init__(self, addon, profile, search_cache=None, tmdb_api=None):
         self.addon = addon
         self.profile = profile
+        self.search_cache = search_cache
+        self.tmdb_api = tmdb_api
+        # Directory of the former one JSON file per series layout, imported into the store
         self.series_db_path = os.path.join(profile, 'series_db')
         self.ensure_db_exists()
+        self.store = SeriesStore(profile)
+        if os.path.isdir(self.series_db_path):
+            self.store.import_json(self.series_db_path, self._safe_filename)
+            try:
+                os.rmdir(self.series_db_path)
+            except OSError:
+                pass
         
     def ensure_db_exists(self):
-        """Ensure that the series database directory exists"""
+        """Ensure that the profile directory exists"""
         try:
             if not os.path.exists(self.profile):
                 os.makedirs(self.profile)
-            if not os.path.exists(self.series_db_path):
-                os.makedirs(self.series_db_path)
         except Exception as e:
             xbmc.log(f'YaWSP Series Manager: Error creating directories: {str(e)}', level=xbmc.LOGERROR)
     
-    def search_series(self, series_name, api_function, token):
-        """Search for episodes of a series"""
+    def search_series(self, series_name, api_function, token, progress=None):
+        """
+        Search for episodes of a series.
+        progress(done, total) is called after every finished query.
+        """
         # Structure to hold results
         series_data = {
             'name': series_name,
@@ -61,184 +157,289 @@ class SeriesManager:
             'seasons': {}
         }
         
-        # Define search queries to try
-        search_queries = [
-            series_name,                    # exact name
-            f"{series_name} season",        # name + season
-            f"{series_name} s01",           # name + s01
-            f"{series_name} episode"        # name + episode
-        ]
+        search_queries = self._plan_queries(series_name, series_data)
+        episode_counts = series_data.get('episode_counts') or {}
+        matcher = EpisodeMatcher(series_name)
         
-        all_results = []
+        # Run the queries concurrently, results are merged in query order afterwards
+        query_results = [None] * len(search_queries)
+        with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(search_queries))) as executor:
+            futures = {executor.submit(self._scan_query, query, api_function, token, matcher,
+                                       season, episode_counts.get(str(season), 0)): index
+                       for index, (query, season) in enumerate(search_queries)}
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    query_results[futures[future]] = future.result()
+                except Exception as e:
+                    xbmc.log(f'YaWSP Series Manager: Query "{search_queries[futures[future]][0]}" failed: {str(e)}', level=xbmc.LOGWARNING)
+                if progress:
+                    progress(done, len(search_queries))
         
-        # Try each search query
-        for query in search_queries:
-            results = self._perform_search(query, api_function, token)
-            # Add results to our collection, avoiding duplicates
-            for result in results:
-                if result not in all_results and self._is_likely_episode(result['name'], series_name):
-                    all_results.append(result)
+        # Index the results by ident, avoiding duplicates
+        all_results = {}
+        for results in query_results:
+            for result, found in results or []:
+                if result.ident not in all_results and found.likely:
+                    all_results[result.ident] = (result, found)
         
         # Process results and organize into seasons
-        for item in all_results:
-            season_num, episode_num = self._detect_episode_info(item['name'], series_name)
-            if season_num is not None:
-                # Convert to strings for JSON compatibility
-                season_num_str = str(season_num)
-                episode_num_str = str(episode_num)
-                
-                if season_num_str not in series_data['seasons']:
-                    series_data['seasons'][season_num_str] = {}
-                
-                series_data['seasons'][season_num_str][episode_num_str] = {
-                    'name': item['name'],
-                    'ident': item['ident'],
-                    'size': item.get('size', '0')
-                }
+        self._add_episodes(series_data, all_results.values())
+        
+        # The first query is the plain name sorted by recent, its newest file is where a refresh can stop
+        if query_results[0]:
+            series_data['high_water'] = query_results[0][0][0].ident
         
         # Save the series data
         self._save_series_data(series_name, series_data)
         
         return series_data
     
-    def _is_likely_episode(self, filename, series_name):
-        """Check if a filename is likely to be an episode of the series"""
-        # Skip if doesn't contain series name
-        if not re.search(re.escape(series_name), filename, re.IGNORECASE):
-            return False
+    def refresh_series(self, series_name, api_function, token, progress=None):
+        """
+        Add episodes released since the last scan. The newest files of the series are
+        read page by page until a file already known is reached, so a refresh without
+        anything new costs one request. Returns (series_data, number of new episodes).
+        """
+        series_data = self.load_series_data(series_name)
+        if not series_data or not series_data.get('seasons'):
+            series_data = self.search_series(series_name, api_function, token, progress)
+            return series_data, sum(len(season) for season in series_data['seasons'].values())
+        
+        matcher = EpisodeMatcher(series_name)
+        known = {episode['ident'] for season in series_data['seasons'].values() for episode in season.values()}
+        high_water = series_data.get('high_water')
+        
+        new_results = []
+        newest = None
+        pages = self._pages(series_name, api_function, token, REFRESH_MAX_PAGES)
+        for page, results in enumerate(pages, 1):
+            if progress:
+                progress(page, REFRESH_MAX_PAGES)
+            if newest is None and results:
+                newest = results[0].ident
+            reached = False
+            for result in results:
+                if result.ident == high_water or result.ident in known:
+                    reached = True
+                    break
+                found = matcher.match(result.name)
+                if found.likely:
+                    new_results.append((result, found))
+            if reached:
+                pages.close()
+                break
+        
+        added = self._add_episodes(series_data, new_results)
+        if newest is not None:
+            series_data['high_water'] = newest
+        series_data['last_updated'] = xbmc.getInfoLabel('System.Date')
+        self._save_series_data(series_name, series_data)
+        xbmc.log(f'YaWSP Series Manager: Refresh of {series_name} found {added} new episodes', level=xbmc.LOGDEBUG)
+        
+        return series_data, added
+    
+    def _add_episodes(self, series_data, results):
+        """
+        Place (file, EpisodeMatch) pairs into the seasons of series_data and return how
+        many episodes were new. A multi-episode file is a candidate of every episode it covers.
+        """
+        added = 0
+        for item, found in results:
+            if found.season is None:
+                continue
+            # Convert to strings for JSON compatibility
+            season_num_str = str(found.season)
+            if season_num_str not in series_data['seasons']:
+                series_data['seasons'][season_num_str] = {}
+            season = series_data['seasons'][season_num_str]
             
-        # Positive indicators
-        for pattern in EPISODE_PATTERNS:
-            if re.search(pattern, filename, re.IGNORECASE):
-                return True
-                
-        # Keywords that suggest it's a episode
-        episode_keywords = [
-            'episode', 'season', 'series', 'ep', 
-            'complete', 'serie', 'season', 'disk'
+            for episode_num in found.episodes():
+                episode_num_str = str(episode_num)
+                if episode_num_str not in season:
+                    added += 1
+                season[episode_num_str] = self._rank_episode(season.get(episode_num_str), item)
+        return added
+    
+    def _rank_episode(self, episode, item):
+        """
+        Merge a file into an episode entry. The best scoring file is the entry itself
+        (name, ident, size), the next ones are kept in its alternates list.
+        """
+        candidates = {}
+        if episode:
+            for candidate in [episode] + episode.get('alternates', []):
+                candidate = {key: candidate[key] for key in ('name', 'ident', 'size', 'score') if key in candidate}
+                if 'score' not in candidate:
+                    # Entries saved before ranking have no score yet
+                    candidate['score'] = self._score(candidate['name'], candidate.get('size'))
+                candidates[candidate['ident']] = candidate
+        candidates[item.ident] = {
+            'name': item.name,
+            'ident': item.ident,
+            'size': str(item.size or 0),
+            'score': self._score(item.name, item.size)
+        }
+        
+        ranked = sorted(candidates.values(), key=lambda candidate: candidate['score'], reverse=True)
+        best = dict(ranked[0])
+        best['alternates'] = ranked[1:MAX_ALTERNATES + 1]
+        return best
+    
+    def _score(self, name, size):
+        """Release quality and size score of a file, see search_ranking"""
+        try:
+            size = int(size or 0)
+        except ValueError:
+            size = 0
+        return round(search_ranking.score_result(FileRecord(name=name, size=size)), 2)
+    
+    def _plan_queries(self, series_name, series_data):
+        """
+        Return the Webshare queries of a scan as (query, season) pairs, season is None
+        for a query not bound to a season. With TMDb data there is one query per
+        season ("Name S02"), otherwise a few generic queries are tried.
+        """
+        if self.tmdb_api:
+            try:
+                show, seasons = self.tmdb_api.tv_seasons(series_name)
+            except Exception as e:
+                xbmc.log(f'YaWSP Series Manager: TMDb lookup failed: {str(e)}', level=xbmc.LOGWARNING)
+                show, seasons = None, None
+            if seasons:
+                series_data['tmdb_id'] = show.get('id')
+                series_data['episode_counts'] = {str(number): count for number, count in seasons.items()}
+                xbmc.log(f'YaWSP Series Manager: TMDb knows {len(seasons)} seasons of {series_name}', level=xbmc.LOGDEBUG)
+                return [(series_name, None)] + [(f"{series_name} S{number:02d}", number) for number in sorted(seasons)]
+        
+        return [
+            (series_name, None),                # exact name
+            (f"{series_name} season", None),    # name + season
+            (f"{series_name} s01", None),       # name + s01
+            (f"{series_name} episode", None)    # name + episode
         ]
+    
+    def _max_pages(self):
+        try:
+            return max(1, int(self.addon.getSetting('series_pages')))
+        except ValueError:
+            return DEFAULT_MAX_PAGES
+    
+    def _pages(self, search_query, api_function, token, max_pages):
+        """
+        Yield the result pages of a query, newest first. After the first full page the
+        following pages are requested PAGES_AHEAD at a time, paging ends with a short
+        page, at max_pages or when the generator is closed.
+        """
+        executor = ThreadPoolExecutor(max_workers=PAGES_AHEAD)
+        pending = deque()
+        next_page = 0
         
-        for keyword in episode_keywords:
-            if keyword in filename.lower():
-                return True
-                
-        return False
+        def request(page):
+            return executor.submit(self._perform_search, search_query, api_function, token,
+                                   offset=page * PAGE_SIZE, limit=PAGE_SIZE)
+        try:
+            pending.append(request(next_page))
+            next_page += 1
+            while pending:
+                results = pending.popleft().result()
+                yield results
+                if len(results) < PAGE_SIZE:
+                    break
+                # Requested only once the consumer asked for more, a caller stopping after a page costs nothing extra
+                while len(pending) < PAGES_AHEAD and next_page < max_pages:
+                    pending.append(request(next_page))
+                    next_page += 1
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+    
+    def _scan_query(self, search_query, api_function, token, matcher, season=None, episode_count=0):
+        """
+        Return (file, EpisodeMatch) pairs of all pages of a scan query. Paging stops at
+        the configured page cap, once a page brings no new likely episode or, for a
+        season query, once files of all episode_count episodes of the season were found.
+        """
+        all_results = []
+        seen = set()
+        season_episodes = set()
+        pages = self._pages(search_query, api_function, token, self._max_pages())
+        for results in pages:
+            new_episodes = 0
+            for result in results:
+                found = matcher.match(result.name)
+                all_results.append((result, found))
+                if result.ident not in seen:
+                    seen.add(result.ident)
+                    if found.likely:
+                        new_episodes += 1
+                        if season is not None and found.season == season:
+                            season_episodes.update(found.episodes())
+            if not new_episodes or (episode_count and len(season_episodes) >= episode_count):
+                pages.close()
+                break
+        return all_results
     
-    def _perform_search(self, search_query, api_function, token):
+    def _perform_search(self, search_query, api_function, token, offset=0, limit=PAGE_SIZE):
         """Perform the actual search using the provided API function"""
         results = []
         
         # Call the Webshare API to search for the series
-        response = api_function('search', {
+        params = {
             'what': search_query, 
             'category': 'video', 
             'sort': 'recent',
-            'limit': 100,  # Get a good number of results to find episodes
-            'offset': 0,
+            'limit': limit,  # Get a good number of results to find episodes
+            'offset': offset,
             'wst': token,
             'maybe_removed': 'true'
-        })
+        }
+        
+        if self.search_cache:
+            content = self.search_cache.fetch(params, lambda: api_function('search', params).content)
+        else:
+            content = api_function('search', params).content
         
-        xml = ET.fromstring(response.content)
+        reader = ResponseReader(content)
         
         # Check if the search was successful
-        status = xml.find('status')
-        if status is not None and status.text == 'OK':
-            # Convert XML to a list of dictionaries
-            for file in xml.iter('file'):
-                item = {}
-                for elem in file:
-                    item[elem.tag] = elem.text
-                results.append(item)
+        if reader.ok:
+            results = reader.read()
+        else:
+            xbmc.log(f'YaWSP Series Manager: Search for {search_query} failed', level=xbmc.LOGWARNING)
         
         return results
     
-    def _detect_episode_info(self, filename, series_name):
-        """Try to detect season and episode numbers from filename"""
-        # Remove series name and clean up the string
-        cleaned = filename.lower().replace(series_name.lower(), '').strip()
-        
-        # Try each of our patterns
-        for pattern in EPISODE_PATTERNS:
-            match = re.search(pattern, cleaned)
-            if match:
-                groups = match.groups()
-                if len(groups) == 2:  # Patterns like S01E02
-                    return int(groups[0]), int(groups[1])
-                elif len(groups) == 1:  # Patterns like Episode 5
-                    # Assume season 1 if only episode number is found
-                    return 1, int(groups[0])
-        
-        # If no match found, try to infer from the filename
-        if 'season' in cleaned.lower() or 'serie' in cleaned.lower():
-            # Try to find season number
-            season_match = re.search(r'season\s*(\d+)', cleaned.lower())
-            if season_match:
-                season_num = int(season_match.group(1))
-                # Try to find episode number
-                ep_match = re.search(r'(\d+)', cleaned.replace(season_match.group(0), ''))
-                if ep_match:
-                    return season_num, int(ep_match.group(1))
-        
-        # Default fallback
-        return None, None
-    
     def _save_series_data(self, series_name, series_data):
         """Save series data to the database"""
-        safe_name = self._safe_filename(series_name)
-        file_path = os.path.join(self.series_db_path, f"{safe_name}.json")
-        
         try:
-            with io.open(file_path, 'w', encoding='utf8') as file:
-                try:
-                    data = json.dumps(series_data, indent=2).decode('utf8')
-                except AttributeError:
-                    data = json.dumps(series_data, indent=2)
-                file.write(data)
-                file.close()
+            self.store.save(self._safe_filename(series_name), series_data)
         except Exception as e:
             xbmc.log(f'YaWSP Series Manager: Error saving series data: {str(e)}', level=xbmc.LOGERROR)
     
     def load_series_data(self, series_name):
         """Load series data from the database"""
-        safe_name = self._safe_filename(series_name)
-        file_path = os.path.join(self.series_db_path, f"{safe_name}.json")
-        
-        if not os.path.exists(file_path):
-            return None
-        
         try:
-            with io.open(file_path, 'r', encoding='utf8') as file:
-                data = file.read()
-                file.close()
-                try:
-                    series_data = json.loads(data, "utf-8")
-                except TypeError:
-                    series_data = json.loads(data)
-                return series_data
+            return self.store.load(self._safe_filename(series_name))
         except Exception as e:
             xbmc.log(f'YaWSP Series Manager: Error loading series data: {str(e)}', level=xbmc.LOGERROR)
             return None
     
     def get_all_series(self):
         """Get a list of all saved series"""
-        series_list = []
-        
         try:
-            for filename in os.listdir(self.series_db_path):
-                if filename.endswith('.json'):
-                    series_name = os.path.splitext(filename)[0]
-                    # Convert safe filename back to proper name (rough conversion)
-                    proper_name = series_name.replace('_', ' ')
-                    series_list.append({
-                        'name': proper_name,
-                        'filename': filename,
-                        'safe_name': series_name
-                    })
+            return [{'name': name, 'safe_name': key} for key, name in self.store.list_series()]
         except Exception as e:
             xbmc.log(f'YaWSP Series Manager: Error listing series: {str(e)}', level=xbmc.LOGERROR)
-        
-        return series_list
+            return []
+    
+    def get_seasons(self, series_name):
+        """Get the season numbers of a series"""
+        return self.store.seasons(self._safe_filename(series_name))
+    
+    def get_episodes(self, series_name, season_num):
+        """Get [(episode number, episode)] of one season of a series"""
+        return self.store.episodes(self._safe_filename(series_name), season_num)
     
     def _safe_filename(self, name):
         """Convert a series name to a safe filename"""
@@ -274,8 +475,8 @@ def create_seasons_menu(series_manager, handle, series_name):
     """Create menu of seasons for a series"""
     import xbmcplugin
     
-    series_data = series_manager.load_series_data(series_name)
-    if not series_data:
+    seasons = series_manager.get_seasons(series_name)
+    if not seasons:
         xbmcgui.Dialog().notification('YaWSP', 'Data serialu nenalezena', xbmcgui.NOTIFICATION_WARNING)
         xbmcplugin.endOfDirectory(handle, succeeded=False)
         return
@@ -286,7 +487,7 @@ def create_seasons_menu(series_manager, handle, series_name):
     xbmcplugin.addDirectoryItem(handle, get_url(action='series_refresh', series_name=series_name), listitem, True)
     
     # List seasons
-    for season_num in sorted(series_data['seasons'].keys(), key=int):
+    for season_num in seasons:
         season_name = f"Rada {season_num}"
         listitem = xbmcgui.ListItem(label=season_name)
         listitem.setArt({'icon': 'DefaultFolder.png'})
@@ -298,27 +499,26 @@ def create_episodes_menu(series_manager, handle, series_name, season_num):
     """Create menu of episodes for a season"""
     import xbmcplugin
     
-    series_data = series_manager.load_series_data(series_name)
-    if not series_data or str(season_num) not in series_data['seasons']:
+    episodes = series_manager.get_episodes(series_name, season_num)
+    if not episodes:
         xbmcgui.Dialog().notification('YaWSP', 'Data sezony nenalezena', xbmcgui.NOTIFICATION_WARNING)
         xbmcplugin.endOfDirectory(handle, succeeded=False)
         return
     
-    # Convert season_num to a string for dict lookup if it's not already
-    season_num = str(season_num)
-    
     # List episodes
-    season = series_data['seasons'][season_num]
-    for episode_num in sorted(season.keys(), key=int):
-        episode = season[episode_num]
+    for episode_num, episode in episodes:
         episode_name = f"Epizoda {episode_num} - {episode['name']}"
         
         listitem = xbmcgui.ListItem(label=episode_name)
         listitem.setArt({'icon': 'DefaultVideo.png'})
         listitem.setProperty('IsPlayable', 'true')
         
-        # Generate URL for playing this episode
-        url = get_url(action='play', ident=episode['ident'], name=episode['name'])
+        # Generate URL for playing this episode, the alternates are tried when the best file fails
+        alternates = ','.join(alternate['ident'] for alternate in episode.get('alternates', []))
+        if alternates:
+            url = get_url(action='play', ident=episode['ident'], name=episode['name'], alt=alternates)
+        else:
+            url = get_url(action='play', ident=episode['ident'], name=episode['name'])
         
         xbmcplugin.addDirectoryItem(handle, url, listitem, False)
     
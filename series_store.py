@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Module: series_store
+# Author: user extension
+# Created on: 18.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import io
+import json
+import sqlite3
+import threading
+import xbmc
+
+STORE_FILE = 'series.db'
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS series ('
+    ' id INTEGER PRIMARY KEY, key TEXT UNIQUE, name TEXT, last_updated TEXT,'
+    ' high_water TEXT, tmdb_id INTEGER)',
+    'CREATE TABLE IF NOT EXISTS seasons ('
+    ' series_id INTEGER, season INTEGER, episode_count INTEGER,'
+    ' PRIMARY KEY (series_id, season))',
+    'CREATE TABLE IF NOT EXISTS episodes ('
+    ' series_id INTEGER, season INTEGER, episode INTEGER, name TEXT, ident TEXT,'
+    ' size TEXT, score REAL, alternates TEXT,'
+    ' PRIMARY KEY (series_id, season, episode))',
+)
+
+class SeriesStore:
+    """
+    SQLite store of followed series.
+    The series dicts used by SeriesManager are saved in one transaction, the menus
+    read only the rows of the level they show.
+    """
+
+    def __init__(self, profile):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(profile, STORE_FILE), timeout=10, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                self._db.execute(statement)
+
+    def _series_id(self, key):
+        row = self._db.execute('SELECT id FROM series WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, key, series_data):
+        """Replace the stored series key with series_data"""
+        episodes = []
+        for season, season_episodes in series_data['seasons'].items():
+            for episode, entry in season_episodes.items():
+                episodes.append((int(season), int(episode), entry['name'], entry['ident'], entry.get('size'),
+                                 entry.get('score'), json.dumps(entry.get('alternates') or [])))
+        counts = {int(season): count for season, count in (series_data.get('episode_counts') or {}).items()}
+        seasons = [(season, counts.get(season)) for season in {int(season) for season in series_data['seasons']} | set(counts)]
+
+        with self._lock, self._db:
+            self._db.execute('INSERT OR IGNORE INTO series (key) VALUES (?)', (key,))
+            self._db.execute('UPDATE series SET name = ?, last_updated = ?, high_water = ?, tmdb_id = ? WHERE key = ?',
+                             (series_data['name'], series_data.get('last_updated'),
+                              series_data.get('high_water'), series_data.get('tmdb_id'), key))
+            series_id = self._series_id(key)
+            self._db.execute('DELETE FROM seasons WHERE series_id = ?', (series_id,))
+            self._db.execute('DELETE FROM episodes WHERE series_id = ?', (series_id,))
+            self._db.executemany('INSERT INTO seasons (series_id, season, episode_count) VALUES (?, ?, ?)',
+                                 [(series_id, season, count) for season, count in seasons])
+            self._db.executemany('INSERT INTO episodes (series_id, season, episode, name, ident, size, score, alternates) '
+                                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                 [(series_id,) + episode for episode in episodes])
+
+    def load(self, key):
+        """Return the whole series dict of key or None"""
+        with self._lock:
+            row = self._db.execute('SELECT id, name, last_updated, high_water, tmdb_id FROM series WHERE key = ?',
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            series_id, name, last_updated, high_water, tmdb_id = row
+            season_rows = self._db.execute('SELECT season, episode_count FROM seasons WHERE series_id = ?',
+                                           (series_id,)).fetchall()
+            episode_rows = self._db.execute('SELECT season, episode, name, ident, size, score, alternates '
+                                            'FROM episodes WHERE series_id = ?', (series_id,)).fetchall()
+
+        series_data = {'name': name, 'last_updated': last_updated, 'seasons': {}}
+        if high_water:
+            series_data['high_water'] = high_water
+        if tmdb_id:
+            series_data['tmdb_id'] = tmdb_id
+        counts = {str(season): count for season, count in season_rows if count is not None}
+        if counts:
+            series_data['episode_counts'] = counts
+        for season, episode, file_name, ident, size, score, alternates in episode_rows:
+            series_data['seasons'].setdefault(str(season), {})[str(episode)] = self._episode(
+                file_name, ident, size, score, alternates)
+        return series_data
+
+    def list_series(self):
+        """Return (key, display name) of every stored series"""
+        with self._lock:
+            return self._db.execute('SELECT key, name FROM series ORDER BY name COLLATE NOCASE').fetchall()
+
+    def seasons(self, key):
+        """Return the numbers of the seasons of key that have episodes"""
+        with self._lock:
+            rows = self._db.execute('SELECT DISTINCT e.season FROM episodes e JOIN series s ON s.id = e.series_id '
+                                    'WHERE s.key = ? ORDER BY e.season', (key,)).fetchall()
+        return [row[0] for row in rows]
+
+    def episodes(self, key, season):
+        """Return [(episode number, episode dict)] of one season of key, in order"""
+        with self._lock:
+            rows = self._db.execute('SELECT e.episode, e.name, e.ident, e.size, e.score, e.alternates '
+                                    'FROM episodes e JOIN series s ON s.id = e.series_id '
+                                    'WHERE s.key = ? AND e.season = ? ORDER BY e.episode',
+                                    (key, int(season))).fetchall()
+        return [(episode, self._episode(*row)) for episode, *row in rows]
+
+    def _episode(self, name, ident, size, score, alternates):
+        entry = {'name': name, 'ident': ident, 'size': size}
+        if score is not None:
+            entry['score'] = score
+        if alternates:
+            entry['alternates'] = json.loads(alternates)
+        return entry
+
+    def import_json(self, directory, key_function):
+        """Move the series of the old one-JSON-file-per-series directory into the store"""
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith('.json')]
+        except OSError:
+            return
+        for file_name in names:
+            file_path = os.path.join(directory, file_name)
+            try:
+                with io.open(file_path, 'r', encoding='utf8') as file:
+                    series_data = json.load(file)
+                self.save(key_function(series_data['name']), series_data)
+                os.remove(file_path)
+            except Exception as e:
+                xbmc.log(f'YaWSP Series Store: Error importing {file_name}: {str(e)}', level=xbmc.LOGERROR)
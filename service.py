@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Module: service
+# Author: user extension
+# Created on: 18.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import time
+import requests
+import xbmc
+import xbmcaddon
+import xbmcgui
+from concurrent.futures import ThreadPoolExecutor
+
+import series_manager
+from webshare_api import API, HEADERS, OK_STATUS
+
+try:
+    from xbmc import translatePath
+except ImportError:
+    from xbmcvfs import translatePath
+
+CHECK_INTERVAL = 60  # seconds between checks whether a refresh is due
+TIMEOUT = 30
+
+class SeriesService:
+    """Refreshes all followed series in the background while Kodi is idle"""
+
+    def __init__(self):
+        self.monitor = xbmc.Monitor()
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+
+    def run(self):
+        xbmc.log('YaWSP Service: started', level=xbmc.LOGINFO)
+        while not self.monitor.abortRequested():
+            addon = xbmcaddon.Addon()
+            if addon.getSetting('series_service') == 'true' and self.due(addon) and self.idle(addon):
+                self.refresh_all(addon)
+            if self.monitor.waitForAbort(CHECK_INTERVAL):
+                break
+        xbmc.log('YaWSP Service: stopped', level=xbmc.LOGINFO)
+
+    def due(self, addon):
+        try:
+            last = float(addon.getSetting('series_service_last') or 0)
+        except ValueError:
+            last = 0
+        return time.time() - last >= getnumber(addon, 'series_service_hours', 6) * 60 * 60
+
+    def idle(self, addon):
+        # Never compete with playback, and wait until the user left Kodi alone for a while
+        if xbmc.Player().isPlaying():
+            return False
+        return xbmc.getGlobalIdleTime() >= getnumber(addon, 'series_service_idle', 5) * 60
+
+    def api(self, fnct, data):
+        return self.session.post(API + fnct + "/", data=data, timeout=TIMEOUT)
+
+    def refresh_all(self, addon):
+        token = addon.getSetting('token')
+        if not token:
+            return
+        # The service can't log in, an expired token is left for the plugin to renew
+        try:
+            valid = OK_STATUS in self.api('user_data', {'wst': token}).content
+        except Exception as e:
+            xbmc.log(f'YaWSP Service: token check failed: {str(e)}', level=xbmc.LOGWARNING)
+            return
+        if not valid:
+            xbmc.log('YaWSP Service: token is not valid, skipping the refresh', level=xbmc.LOGWARNING)
+            return
+        addon.setSetting('series_service_last', str(int(time.time())))
+        profile = translatePath(addon.getAddonInfo('profile'))
+        sm = series_manager.SeriesManager(addon, profile)
+        series_list = sm.get_all_series()
+        xbmc.log(f'YaWSP Service: refreshing {len(series_list)} series', level=xbmc.LOGINFO)
+
+        def refresh(series):
+            if self.monitor.abortRequested():
+                return series['name'], 0
+            series_data, added = sm.refresh_series(series['name'], self.api, token)
+            return series_data['name'], added
+
+        workers = max(1, getnumber(addon, 'series_service_workers', 2))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(refresh, series) for series in series_list]
+            for future in futures:
+                try:
+                    name, added = future.result()
+                except Exception as e:
+                    xbmc.log(f'YaWSP Service: refresh failed: {str(e)}', level=xbmc.LOGWARNING)
+                    continue
+                if added:
+                    xbmcgui.Dialog().notification(addon.getAddonInfo('name'), f'{name}: {added} novych epizod',
+                                                  xbmcgui.NOTIFICATION_INFO, 5000, sound=False)
+
+def getnumber(addon, setting, default=0):
+    try:
+        return int(addon.getSetting(setting))
+    except ValueError:
+        return default
+
+if __name__ == '__main__':
+    SeriesService().run()
@@ -3,7 +3,11 @@ import os
 import json
 import re
 import requests
+import sqlite3
+import threading
 import time
+import unidecode
+from concurrent.futures import ThreadPoolExecutor, wait
 
 
 # TMDb API constants
@@ -14,7 +18,200 @@ BACKDROP_SIZE = "w780"  # Medium size backdrop
 
 # Cache settings
 CACHE_EXPIRY = 7 * 24 * 60 * 60  # 7 days in seconds
+NEGATIVE_CACHE_EXPIRY = 24 * 60 * 60  # lookups without a match are retried after a day
 MAX_CACHE_ENTRIES = 1000
+CACHE_DB = 'tmdb_cache.db'
+LEGACY_CACHE_FILE = 'tmdb_cache.json'
+EVICT_INTERVAL = 50  # writes between eviction passes
+ALIAS_EXPIRY = 30 * 24 * 60 * 60  # aliases are refreshed from TMDb after 30 days
+MAX_ALIASES = 5000
+
+# Requests
+REQUEST_TIMEOUT = 10  # seconds
+RATE_LIMIT = 40  # requests per RATE_PERIOD, shared by all threads
+RATE_PERIOD = 10  # seconds
+MAX_RETRIES = 2  # retries of a throttled (429) request
+MAX_RETRY_WAIT = 10  # seconds, longer Retry-After values give up instead
+
+# Parallel enrichment of search results
+ENRICH_WORKERS = 4
+ENRICH_TIMEOUT = 5  # seconds, results not enriched by then are listed without metadata
+
+class TokenBucket:
+    """Thread-safe token bucket, acquire() blocks until a request may be sent"""
+    
+    def __init__(self, rate, period):
+        self.capacity = rate
+        self.fill_rate = rate / period
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = max(self.paused_until - now, (1 - self.tokens) / self.fill_rate)
+            time.sleep(wait_for)
+    
+    def pause(self, seconds):
+        """Hold back every request for seconds, used when the server throttles us"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+# One limiter for all TMDbAPI instances, the limit applies to the API key
+_rate_limiter = TokenBucket(RATE_LIMIT, RATE_PERIOD)
+
+def normalize_title(title):
+    """Lowercase ASCII form of a title without punctuation, used for cache keys"""
+    title = unidecode.unidecode(str(title)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', title).split())
+
+def is_negative(data):
+    """True for a response that did not find anything"""
+    return not data or ('results' in data and not data['results'])
+
+class TMDbCache:
+    """
+    SQLite store of TMDb responses.
+    Entries are read and written one key at a time, expired and least recently
+    used entries are dropped every EVICT_INTERVAL writes. The write count is kept
+    in the database, as every plugin call opens the store anew.
+    """
+    
+    def __init__(self, path, expiry=CACHE_EXPIRY, max_entries=MAX_CACHE_ENTRIES):
+        self.expiry = expiry
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # One connection shared by the enrichment threads, serialized by the lock
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS cache '
+                             '(key TEXT PRIMARY KEY, data TEXT, expires REAL, accessed REAL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+            # Normalized queries and titles mapped to the movie they found
+            self._db.execute('CREATE TABLE IF NOT EXISTS aliases '
+                             '(alias TEXT PRIMARY KEY, movie TEXT, updated REAL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS aliases_updated ON aliases (updated)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)')
+            self._db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('writes', 0)")
+            # Entries imported under the old JSON keys carry the API key and are never hit
+            self._db.execute('''DELETE FROM cache WHERE key LIKE '%"api_key"%' ''')
+    
+    def get(self, key):
+        """Return the cached data of key or None when missing or expired"""
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._db.execute('SELECT data, expires FROM cache WHERE key = ?', (key,)).fetchone()
+                if row is None or row[1] <= now:
+                    return None
+                with self._db:
+                    self._db.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Error reading TMDb cache: {str(e)}")
+            return None
+    
+    def put(self, key, data, expiry=None):
+        """Store data under key for expiry seconds"""
+        now = time.time()
+        expires = now + (self.expiry if expiry is None else expiry)
+        try:
+            with self._lock, self._db:
+                self._db.execute('INSERT OR REPLACE INTO cache (key, data, expires, accessed) VALUES (?, ?, ?, ?)',
+                                 (key, json.dumps(data, ensure_ascii=False), expires, now))
+                self._count_write(now)
+        except sqlite3.Error as e:
+            print(f"Error saving TMDb cache: {str(e)}")
+    
+    def get_alias(self, alias):
+        """Return the movie stored for a normalized alias or None"""
+        try:
+            with self._lock:
+                row = self._db.execute('SELECT movie, updated FROM aliases WHERE alias = ?', (alias,)).fetchone()
+            if row is None or row[1] + ALIAS_EXPIRY <= time.time():
+                return None
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Error reading TMDb aliases: {str(e)}")
+            return None
+    
+    def put_aliases(self, aliases, movie):
+        """Map every normalized alias to movie"""
+        now = time.time()
+        data = json.dumps(movie, ensure_ascii=False)
+        try:
+            with self._lock, self._db:
+                self._db.executemany('INSERT OR REPLACE INTO aliases (alias, movie, updated) VALUES (?, ?, ?)',
+                                     [(alias, data, now) for alias in aliases if alias])
+                self._count_write(now)
+        except sqlite3.Error as e:
+            print(f"Error saving TMDb aliases: {str(e)}")
+    
+    def titles(self, limit=500):
+        """Return the titles of the most recently indexed movies"""
+        try:
+            with self._lock:
+                rows = self._db.execute('SELECT movie FROM aliases ORDER BY updated DESC LIMIT ?', (limit * 4,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading TMDb aliases: {str(e)}")
+            return []
+        titles = []
+        for row in rows:
+            title = json.loads(row[0]).get('title')
+            if title and title not in titles:
+                titles.append(title)
+                if len(titles) >= limit:
+                    break
+        return titles
+    
+    def _count_write(self, now):
+        # Runs in the transaction of the write it counts, eviction joins it too
+        self._db.execute("UPDATE meta SET value = value + 1 WHERE name = 'writes'")
+        writes = self._db.execute("SELECT value FROM meta WHERE name = 'writes'").fetchone()[0]
+        if writes >= EVICT_INTERVAL:
+            self._evict(now)
+    
+    def _evict(self, now):
+        self._db.execute("UPDATE meta SET value = 0 WHERE name = 'writes'")
+        self._db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        self._db.execute('DELETE FROM cache WHERE key IN '
+                         '(SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                         (self.max_entries,))
+        self._db.execute('DELETE FROM aliases WHERE alias IN '
+                         '(SELECT alias FROM aliases ORDER BY updated DESC LIMIT -1 OFFSET ?)',
+                         (MAX_ALIASES,))
+    
+    def import_json(self, cache_file, rekey):
+        """
+        Move the entries of the old JSON cache file into the store and remove the file.
+        rekey(old key) returns the key of an entry, entries it returns None for are dropped.
+        """
+        try:
+            with io.open(cache_file, 'r', encoding='utf8') as f:
+                cache_data = json.load(f)
+            now = time.time()
+            rows = []
+            for key, entry in cache_data.items():
+                key = rekey(key)
+                if key is not None and entry.get('timestamp', 0) + self.expiry > now:
+                    rows.append((key, json.dumps(entry.get('data'), ensure_ascii=False),
+                                 entry.get('timestamp', 0) + self.expiry, entry.get('timestamp', 0)))
+            with self._lock, self._db:
+                self._db.executemany('INSERT OR IGNORE INTO cache (key, data, expires, accessed) VALUES (?, ?, ?, ?)', rows)
+            os.remove(cache_file)
+        except Exception as e:
+            print(f"Error importing TMDb cache: {str(e)}")
 
 class TMDbAPI:
     """TMDb API wrapper for YAWSP"""
@@ -25,8 +222,12 @@ class TMDbAPI:
         self.language = addon.getSetting('tmdb_language') or 'en-US'
         self.include_adult = addon.getSetting('tmdb_adult') == 'true'
         self.profile_path = profile_path
-        self.cache_file = os.path.join(profile_path, 'tmdb_cache.json')
-        self.cache = self._load_cache()
+        self.cache = self._open_cache()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=ENRICH_WORKERS)
+        self.session.mount('https://', adapter)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
 
     def enhance_search_query(self, user_query):
         """
@@ -36,8 +237,10 @@ class TMDbAPI:
         if not self.api_key:
             return [user_query]  # Fallback to original query
         
-        # Try to search for movies first
-        movie_result = self.search_movie(user_query)
+        # Known queries and titles are answered from the alias index, TMDb is asked only on a miss
+        movie_result = self.cache.get_alias(self._alias_key(user_query)) if self.cache is not None else None
+        if movie_result is None:
+            movie_result = self.search_movie(user_query)
         
         search_variants = [user_query]  # Always include original query
         
@@ -73,78 +276,118 @@ class TMDbAPI:
         
         return unique_variants
         
-    def _load_cache(self):
-        """Load the TMDb cache from disk"""
+    def _open_cache(self):
+        """Open the TMDb cache store, taking over the old JSON cache file if there is one"""
         try:
-            if os.path.exists(self.cache_file):
-                with io.open(self.cache_file, 'r', encoding='utf8') as f:
-                    cache_data = json.load(f)
-                # Clean expired entries
-                now = time.time()
-                cache_data = {k: v for k, v in cache_data.items() 
-                              if v.get('timestamp', 0) + CACHE_EXPIRY > now}
-                return cache_data
+            if not os.path.exists(self.profile_path):
+                os.makedirs(self.profile_path)
+            cache = TMDbCache(os.path.join(self.profile_path, CACHE_DB))
         except Exception as e:
-            print(f"Error loading TMDb cache: {str(e)}")
-        return {}
-    
-    def _save_cache(self):
-        """Save the TMDb cache to disk"""
-        try:
-            # Ensure cache doesn't grow too large
-            if len(self.cache) > MAX_CACHE_ENTRIES:
-                # Sort by timestamp and keep only the most recent entries
-                sorted_items = sorted(self.cache.items(), 
-                                      key=lambda x: x[1].get('timestamp', 0), 
-                                      reverse=True)
-                self.cache = dict(sorted_items[:MAX_CACHE_ENTRIES])
-            
-            # Save cache to disk
-            with io.open(self.cache_file, 'w', encoding='utf8') as f:
-                json.dump(self.cache, f, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving TMDb cache: {str(e)}")
+            print(f"Error opening TMDb cache: {str(e)}")
+            return None
+        legacy_file = os.path.join(self.profile_path, LEGACY_CACHE_FILE)
+        if os.path.exists(legacy_file):
+            cache.import_json(legacy_file, self._legacy_key)
+        return cache
     
     def _api_request(self, endpoint, params=None):
         """Make a request to the TMDb API"""
+        return self._request(endpoint, params)[0]
+    
+    def _request(self, endpoint, params=None):
+        """Return (data, fresh) of a request, fresh tells whether data came from TMDb rather than the cache"""
         if not self.api_key:
-            return None
+            return None, False
             
         if params is None:
             params = {}
         
-        # Add API key and language to params
-        params['api_key'] = self.api_key
+        # Add language to params, the API key is added to the request only
         params['language'] = self.language
         
-        # Create cache key from endpoint and params
-        cache_key = json.dumps({'endpoint': endpoint, 'params': params}, sort_keys=True)
+        cache_key = self._cache_key(endpoint, params)
         
         # Check cache first
-        if cache_key in self.cache:
-            cache_entry = self.cache[cache_key]
-            # Check if cache entry is still valid
-            if cache_entry.get('timestamp', 0) + CACHE_EXPIRY > time.time():
-                return cache_entry.get('data')
+        if self.cache is not None:
+            data = self.cache.get(cache_key)
+            if data is not None:
+                return (None if data == {} else data), False
         
         # Make API request
         try:
-            url = f"{TMDB_API_URL}/{endpoint}"
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            response = self._get(endpoint, dict(params, api_key=self.api_key))
+            if response.status_code == 404:
+                # Unknown id, remembered like a search without results
+                data = {}
+            else:
+                response.raise_for_status()
+                data = response.json()
             
-            # Update cache
-            self.cache[cache_key] = {
-                'data': data,
-                'timestamp': time.time()
-            }
-            self._save_cache()
+            # Update cache, misses are kept for a shorter time
+            if self.cache is not None:
+                self.cache.put(cache_key, data, NEGATIVE_CACHE_EXPIRY if is_negative(data) else None)
             
-            return data
+            return (None if data == {} else data), True
         except Exception as e:
             print(f"TMDb API error: {str(e)}")
+            return None, False
+    
+    def _get(self, endpoint, params):
+        """GET an endpoint within the rate limit, retrying when throttled"""
+        url = f"{TMDB_API_URL}/{endpoint}"
+        for attempt in range(MAX_RETRIES + 1):
+            _rate_limiter.acquire()
+            started = time.monotonic()
+            response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+            throttled = response.status_code == 429
+            self._record(endpoint, time.monotonic() - started, throttled)
+            if not throttled:
+                return response
+            try:
+                retry_after = float(response.headers.get('Retry-After', 1))
+            except ValueError:
+                retry_after = 1
+            if retry_after > MAX_RETRY_WAIT or attempt == MAX_RETRIES:
+                break
+            _rate_limiter.pause(retry_after)
+        return response
+    
+    def _record(self, endpoint, elapsed, throttled):
+        # Ids are folded so all movie/<id> requests are counted together
+        name = re.sub(r'\d+', '{id}', endpoint)
+        with self._stats_lock:
+            entry = self._stats.setdefault(name, {'requests': 0, 'throttled': 0, 'time': 0.0, 'max_time': 0.0})
+            entry['requests'] += 1
+            entry['throttled'] += int(throttled)
+            entry['time'] += elapsed
+            entry['max_time'] = max(entry['max_time'], elapsed)
+    
+    def stats(self):
+        """Per-endpoint request, throttle and latency counters of this instance"""
+        with self._stats_lock:
+            return {name: dict(entry, avg_time=entry['time'] / entry['requests'])
+                    for name, entry in self._stats.items()}
+    
+    def _cache_key(self, endpoint, params):
+        """Cache key of a request, a search query is normalized so spelling variants share it"""
+        key_params = dict(params)
+        if 'query' in key_params:
+            key_params['query'] = normalize_title(key_params['query'])
+        return json.dumps({'endpoint': endpoint, 'params': key_params}, sort_keys=True)
+    
+    def _legacy_key(self, key):
+        """Cache key of an entry of the old JSON cache, whose keys held the raw params with the API key"""
+        try:
+            old = json.loads(key)
+            params = dict(old['params'])
+        except (ValueError, KeyError, TypeError):
             return None
+        params.pop('api_key', None)
+        return self._cache_key(old['endpoint'], params)
+    
+    def known_titles(self, limit=500):
+        """Titles of movies found by earlier lookups, most recent first"""
+        return self.cache.titles(limit) if self.cache is not None else []
     
     def search_movie(self, title, year=None):
         """Search for a movie by title and optional year"""
@@ -156,16 +399,80 @@ class TMDbAPI:
         if year:
             params['year'] = year
             
-        result = self._api_request('search/movie', params)
+        result, fresh = self._request('search/movie', params)
         if not result or not result.get('results'):
             return None
-            
-        return result['results'][0]  # Return the best match
+        
+        movie = result['results'][0]  # Return the best match
+        # A cached response was indexed when it was fetched
+        if fresh:
+            self._index_aliases(title, year, movie)
+        return movie
+    
+    def _alias_key(self, text):
+        # titles and the best match differ between languages
+        return f"{self.language}|{normalize_title(text)}"
+    
+    def _index_aliases(self, query, year, movie):
+        """Remember the query and the titles of movie in the alias index"""
+        if self.cache is None or not movie.get('title'):
+            return
+        entry = {name: movie.get(name) for name in ('id', 'title', 'original_title', 'release_date')}
+        aliases = set()
+        if year:
+            # A year-filtered match is not what the bare title finds, e.g. "Dune 1984"
+            aliases.add(self._alias_key(f"{query} {year}"))
+        else:
+            aliases.add(self._alias_key(query))
+            aliases.add(self._alias_key(movie['title']))
+            if movie.get('original_title'):
+                aliases.add(self._alias_key(movie['original_title']))
+        if movie.get('release_date'):
+            aliases.add(self._alias_key(f"{movie['title']} {movie['release_date'][:4]}"))
+        self.cache.put_aliases(aliases, entry)
     
     def get_movie_details(self, movie_id):
         """Get detailed information for a movie"""
         return self._api_request(f'movie/{movie_id}')
     
+    def search_tv(self, name, year=None):
+        """Search for a TV show by name and optional first air year"""
+        params = {
+            'query': name,
+            'include_adult': str(self.include_adult).lower()
+        }
+        
+        if year:
+            params['first_air_date_year'] = year
+        
+        result = self._api_request('search/tv', params)
+        if not result or not result.get('results'):
+            return None
+        
+        return result['results'][0]  # Return the best match
+    
+    def get_tv_details(self, tv_id):
+        """Get detailed information for a TV show, including its list of seasons"""
+        return self._api_request(f'tv/{tv_id}')
+    
+    def tv_seasons(self, name):
+        """
+        Return (show, seasons) for the best matching TV show, where seasons maps the
+        number of every regular season to its episode count, or (None, None)
+        """
+        show = self.search_tv(name)
+        if not show:
+            return None, None
+        details = self.get_tv_details(show['id'])
+        if not details:
+            return None, None
+        seasons = {}
+        for season in details.get('seasons') or []:
+            # Season 0 holds specials, they are not released as SxxEyy
+            if season.get('season_number'):
+                seasons[season['season_number']] = season.get('episode_count') or 0
+        return details, seasons
+    
     def extract_title_year(self, filename):
         """Extract title and year from filename"""
         # Remove common quality terms and extensions
@@ -197,13 +504,61 @@ class TMDbAPI:
         # Extract title and year from filename
         title, year = self.extract_title_year(webshare_result['name'])
         
-        # Search for movie
+        metadata = self.movie_metadata(title, year)
+        if metadata:
+            webshare_result['tmdb'] = metadata
+        
+        return webshare_result
+    
+    def enrich_results(self, webshare_results, max_workers=ENRICH_WORKERS, timeout=ENRICH_TIMEOUT):
+        """
+        Enrich a list of Webshare search results in parallel.
+        Files with the same extracted title and year share one lookup. Lookups not
+        finished within timeout are abandoned and their files are left as they are.
+        """
+        if not self.api_key:
+            return webshare_results
+        
+        # Group the files by what would be searched on TMDb
+        groups = {}
+        for index, result in enumerate(webshare_results):
+            if 'name' in result:
+                groups.setdefault(self.extract_title_year(result['name']), []).append(index)
+        if not groups:
+            return webshare_results
+        
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(groups)))
+        try:
+            futures = {executor.submit(self.movie_metadata, *key): key for key in groups}
+            done, pending = wait(futures, timeout=timeout)
+            for future in pending:
+                future.cancel()
+        finally:
+            # Do not wait for lookups past the deadline, they only fill the cache
+            executor.shutdown(wait=False)
+        
+        # Results are applied here, so a late lookup never touches the listed files
+        for future in done:
+            try:
+                metadata = future.result()
+            except Exception as e:
+                print(f"TMDb enrichment error: {str(e)}")
+                continue
+            if metadata:
+                for index in groups[futures[future]]:
+                    webshare_results[index]['tmdb'] = metadata
+        
+        if pending:
+            print(f"TMDb enrichment: {len(pending)} of {len(groups)} lookups timed out")
+        return webshare_results
+    
+    def movie_metadata(self, title, year=None):
+        """Return the TMDb metadata of the best matching movie or None"""
         movie = self.search_movie(title, year)
         if not movie:
-            return webshare_result
+            return None
         
-        # Enrich result with metadata
-        webshare_result['tmdb'] = {
+        return {
             'id': movie.get('id'),
             'title': movie.get('title'),
             'original_title': movie.get('original_title'),
@@ -213,6 +568,4 @@ class TMDbAPI:
             'poster_path': f"{TMDB_IMAGE_BASE_URL}{POSTER_SIZE}{movie.get('poster_path')}" if movie.get('poster_path') else None,
             'backdrop_path': f"{TMDB_IMAGE_BASE_URL}{BACKDROP_SIZE}{movie.get('backdrop_path')}" if movie.get('backdrop_path') else None
         }
-        
-        return webshare_result
     
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Module: webshare_api
+# Author: user extension
+# Created on: 18.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import re
+
+# Shared by the plugin and the background service
+BASE = 'https://webshare.cz'
+API = BASE + '/api/'
+UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"
+HEADERS = {'User-Agent': UA, 'Referer':BASE}
+OK_STATUS = b'<status>OK</status>'
+# A failed call names a missing or expired login in its error code or message,
+# other failures (a removed file, a bad request) leave the token alone
+AUTH_ERROR_RE = re.compile(rb'<(code|message)>[^<]*(login|token|auth)', re.IGNORECASE)
+
+def auth_failed(content):
+    """Tell whether a response body is a failure caused by the token"""
+    return OK_STATUS not in content and AUTH_ERROR_RE.search(content) is not None
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# Module: webshare_parser
+# Author: user extension
+# Created on: 18.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import datetime
+from collections import deque
+from xml.etree import ElementTree as ET
+
+CHUNK_SIZE = 16 * 1024
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def todict(xml, skip=[]):
+    result = {}
+    for e in xml:
+        if e.tag not in skip:
+            value = e.text if len(e) == 0 else todict(e,skip)
+            if e.tag in result:
+                if isinstance(result[e.tag], list):
+                    result[e.tag].append(value)
+                else:
+                    result[e.tag] = [result[e.tag],value]
+            else:
+                result[e.tag] = value
+    return result
+
+def todate(text):
+    return datetime.datetime.strptime(text, DATE_FORMAT)
+
+class FileRecord:
+    """
+    A file from a Webshare listing.
+
+    Known tags are kept in typed slots (size as int, created as datetime), anything
+    else goes to extra. The dict-style access used by the listing code is kept -
+    a missing or empty value behaves like a missing key.
+    """
+
+    __slots__ = ('ident', 'name', 'type', 'img', 'size', 'created', 'positive_votes', 'negative_votes',
+                 'password', 'search_variant', 'search_priority', 'tmdb', 'extra')
+
+    FIELDS = frozenset(__slots__) - {'extra'}
+    CONVERTERS = {
+        'size': int,
+        'created': todate,
+        'positive_votes': int,
+        'negative_votes': int,
+        'search_priority': int,
+    }
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, None)
+        self.search_priority = 0
+        self.extra = None
+        for key, value in values.items():
+            self[key] = value
+
+    @classmethod
+    def from_element(cls, elem, skip=()):
+        record = cls()
+        for e in elem:
+            if e.tag in skip:
+                continue
+            value = e.text if len(e) == 0 else todict(e, skip)
+            converter = cls.CONVERTERS.get(e.tag)
+            if converter is not None and value is not None:
+                try:
+                    value = converter(value)
+                except (TypeError, ValueError):
+                    value = None
+            record[e.tag] = value
+        return record
+
+    def to_element(self):
+        """Return a <file> element that from_element reads back into the same record"""
+        elem = ET.Element('file')
+        values = [(field, getattr(self, field)) for field in self.__slots__ if field != 'extra']
+        values.extend((self.extra or {}).items())
+        for key, value in values:
+            # nested values (TMDb metadata) are looked up again when needed
+            if value is None or isinstance(value, dict):
+                continue
+            if isinstance(value, datetime.datetime):
+                value = value.strftime(DATE_FORMAT)
+            ET.SubElement(elem, key).text = str(value)
+        return elem
+
+    def get(self, key, default=None):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+        else:
+            value = self.extra.get(key) if self.extra else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __repr__(self):
+        return f'FileRecord(ident={self.ident!r}, name={self.name!r})'
+
+def toresponse(records):
+    """Build an OK search response of records, ResponseReader reads it like one from Webshare"""
+    root = ET.Element('response')
+    ET.SubElement(root, 'status').text = 'OK'
+    ET.SubElement(root, 'total').text = str(len(records))
+    for record in records:
+        root.append(record.to_element())
+    return ET.tostring(root, encoding='utf-8')
+
+def chunked(content, size=CHUNK_SIZE):
+    """Split an already downloaded body so it is parsed in the same small steps as a stream"""
+    view = memoryview(content)
+    for start in range(0, len(view), size):
+        yield view[start:start + size]
+
+class ResponseReader:
+    """
+    Incremental reader of a Webshare API response.
+
+    Files are yielded as FileRecords while the body is still arriving and every
+    processed element is dropped, so the whole tree is never held in memory.
+    Top level values (status, total, ...) are available once they were read -
+    Webshare sends them before the files.
+    """
+
+    def __init__(self, source, skip=()):
+        if isinstance(source, (bytes, bytearray)):
+            source = chunked(source)
+        self._source = source
+        self.skip = skip
+        self.values = {}
+        self._pending = deque()
+        self._records = self._parse()
+
+    @property
+    def status(self):
+        # status precedes the files, so this parses only the head of the response
+        while 'status' not in self.values:
+            try:
+                self._pending.append(next(self._records))
+            except StopIteration:
+                break
+        return self.values.get('status')
+
+    @property
+    def ok(self):
+        return self.status == 'OK'
+
+    @property
+    def total(self):
+        try:
+            return int(self.values.get('total'))
+        except (TypeError, ValueError):
+            return 0
+
+    def __iter__(self):
+        return self.files()
+
+    def files(self):
+        """Yield a FileRecord for every <file> element of the response"""
+        while True:
+            if self._pending:
+                yield self._pending.popleft()
+                continue
+            try:
+                record = next(self._records)
+            except StopIteration:
+                return
+            yield record
+
+    def _parse(self):
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        root = None
+        depth = 0
+        for chunk in self._source:
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                if elem.tag == 'file':
+                    yield FileRecord.from_element(elem, self.skip)
+                elif len(elem) == 0:
+                    self.values[elem.tag] = elem.text
+                root.remove(elem)
+        parser.close()
+
+    def read(self):
+        """Read the whole response and return the list of files"""
+        return list(self.files())
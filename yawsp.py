@@ -22,10 +22,19 @@ import unidecode
 import re
 import zipfile
 import uuid
+import time
+import threading
+import itertools
 import series_manager
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import search_ranking
+import search_cache
+import search_history
+import artwork_cache
 import tmdb
+from webshare_parser import ResponseReader, todict, toresponse, CHUNK_SIZE
+from webshare_api import API, HEADERS, OK_STATUS, auth_failed
 
 try:
     from urllib import urlencode
@@ -39,35 +48,90 @@ try:
 except ImportError:
     from xbmcvfs import translatePath
 
-BASE = 'https://webshare.cz'
-API = BASE + '/api/'
-UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"
-HEADERS = {'User-Agent': UA, 'Referer':BASE}
 REALM = ':Webshare:'
 CATEGORIES = ['','video','images','audio','archives','docs','adult']
 SORTS = ['','recent','rating','largest','smallest']
-SEARCH_HISTORY = 'search_history'
 NONE_WHAT = '%#NONE#%'
 BACKUP_DB = 'D1iIcURxlR'
+SEARCH_VARIANTS = 3
+SUGGESTIONS = 8
+VARIANT_TIMEOUT = 10
+CARRY_TTL = 60 * 60  # seconds the results left over by a page wait for the next page
 
 _url = sys.argv[0]
 _handle = int(sys.argv[1])
 _addon = xbmcaddon.Addon()
 _session = requests.Session()
 _session.headers.update(HEADERS)
+_token_lock = threading.Lock()
+_renewed = {}  # token a call failed with -> token revalidate() returned for it
 _profile = translatePath( _addon.getAddonInfo('profile'))
 try:
     _profile = _profile.decode("utf-8")
 except:
     pass
 
+def getnumber(setting, default=0):
+    try:
+        return int(_addon.getSetting(setting))
+    except ValueError:
+        return default
+
+_search_cache = search_cache.SearchCache(_profile,
+                                         ttl=getnumber('scache_ttl') * 60,
+                                         stale_ttl=getnumber('scache_stale') * 60,
+                                         max_bytes=getnumber('scache_size', 20) * 1024 * 1024)
+_artwork_cache = None
+if _addon.getSetting('tmdb_artcache') == 'true':
+    _artwork_cache = artwork_cache.ArtworkCache(_profile, max_bytes=getnumber('tmdb_artcache_size', 100) * 1024 * 1024)
+_search_log = None
+
+def tmdb_client():
+    # TMDb API instance if the integration is enabled
+    if _addon.getSetting('tmdb_enable') == 'true':
+        return tmdb.TMDbAPI(_addon, _profile)
+    return None
+
+def artwork(url):
+    # local copy of a TMDb image when the artwork cache has it
+    return _artwork_cache.resolve(url) if _artwork_cache else url
+
 def get_url(**kwargs):
     return '{0}?{1}'.format(_url, urlencode(kwargs, 'utf-8'))
 
-def api(fnct, data):
-    response = _session.post(API + fnct + "/", data=data)
+def api(fnct, data, timeout=None):
+    response = _session.post(API + fnct + "/", data=data, timeout=timeout)
+    # the token is validated lazily - only a call rejected for its token makes us check it again
+    if 'wst' in data and fnct != 'user_data' and auth_failed(response.content):
+        token = renew_token(data['wst'])
+        if token and token != data['wst']:
+            data = dict(data)
+            data['wst'] = token
+            response = _session.post(API + fnct + "/", data=data, timeout=timeout)
     return response
 
+def api_stream(fnct, data, timeout=None):
+    """Yield the body of an API call in chunks as it comes off the socket"""
+    response = _session.post(API + fnct + "/", data=data, timeout=timeout, stream=True)
+    chunks = response.iter_content(CHUNK_SIZE)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if b'</status>' in head:
+            break
+    # status is the first element of every response - a failure is short, it is read whole
+    # and a token failure goes through api() to get the token checked
+    if 'wst' in data and OK_STATUS not in head:
+        content = head + b''.join(chunks)
+        yield api(fnct, data, timeout).content if auth_failed(content) else content
+        return
+    yield head
+    for chunk in chunks:
+        yield chunk
+
+def stream_search(data, timeout=None):
+    return _search_cache.stream(data, lambda: api_stream('search', data, timeout))
+
 def is_ok(xml):
     status = xml.find('status').text
     return status == 'OK'
@@ -97,6 +161,7 @@ def login():
         if is_ok(xml):
             token = xml.find('token').text
             _addon.setSetting('token', token)
+            _addon.setSetting('token_checked', '')
             return token
         else:
             popinfo(_addon.getLocalizedString(30102), icon=xbmcgui.NOTIFICATION_ERROR, sound=True)
@@ -105,39 +170,47 @@ def login():
         popinfo(_addon.getLocalizedString(30102), icon=xbmcgui.NOTIFICATION_ERROR, sound=True)
         _addon.openSettings()
 
-def revalidate():
+def token_fresh():
+    try:
+        ttl = int(_addon.getSetting('token_ttl')) * 60
+        checked = float(_addon.getSetting('token_checked'))
+    except ValueError:
+        return False
+    return ttl > 0 and checked <= time.time() < checked + ttl
+
+def renew_token(stale):
+    # search variants and series scans call api() from worker threads - only the first of them
+    # to see a failed token checks it, the rest wait for it and reuse the answer
+    with _token_lock:
+        if stale not in _renewed:
+            _renewed[stale] = revalidate(True)
+        return _renewed[stale]
+
+def revalidate(force=False):
     token = _addon.getSetting('token')
     if len(token) == 0:
         if login():
             return revalidate()
+    elif not force and token_fresh():
+        # the VIP state of the last check stands in for the user_data call
+        if _addon.getSetting('token_vip') != '1':
+            popinfo(_addon.getLocalizedString(30103), icon=xbmcgui.NOTIFICATION_WARNING)
+        return token
     else:
         response = api('user_data', { 'wst': token })
         xml = ET.fromstring(response.content)
-        status = xml.find('status').text
         if is_ok(xml):
             vip = xml.find('vip').text
+            _addon.setSetting('token_vip', vip)
+            _addon.setSetting('token_checked', str(int(time.time())))
             if vip != '1':
                 popinfo(_addon.getLocalizedString(30103), icon=xbmcgui.NOTIFICATION_WARNING)
             return token
         else:
+            _addon.setSetting('token_checked', '')
             if login():
                 return revalidate()
 
-def todict(xml, skip=[]):
-    result = {}
-    for e in xml:
-        if e.tag not in skip:
-            value = e.text if len(list(e)) == 0 else todict(e,skip)
-            if e.tag in result:
-                if isinstance(result[e.tag], list):
-                    result[e.tag].append(value)
-                else:
-                    result[e.tag] = [result[e.tag],value]
-            else:
-                result[e.tag] = value
-    #result = {e.tag:(e.text if len(list(e)) == 0 else todict(e,skip)) for e in xml if e.tag not in skip}
-    return result
-            
 def sizelize(txtsize, units=['B','KB','MB','GB']):
     if txtsize:
         size = float(txtsize)
@@ -182,76 +255,74 @@ def tolistitem(file, addcommands=[]):
     listitem.addContextMenuItems(commands)
     return listitem
 
-def ask(what):
+def ask(what, suggest=False):
     if what is None:
         what = ''
     kb = xbmc.Keyboard(what, _addon.getLocalizedString(30007))
     kb.doModal() # Onscreen keyboard appears
     if kb.isConfirmed():
-        return kb.getText() # User input
+        text = kb.getText() # User input
+        # a past query confirmed unchanged needs no suggestions
+        if suggest and text and text != what and _addon.getSetting('ssuggest') == 'true':
+            return choose_suggestion(text)
+        return text
     return None
-    
-def loadsearch():
-    history = []
-    try:
-        if not os.path.exists(_profile):
-            os.makedirs(_profile)
-    except Exception as e:
-        traceback.print_exc()
-    
-    try:
-        with io.open(os.path.join(_profile, SEARCH_HISTORY), 'r', encoding='utf8') as file:
-            fdata = file.read()
-            file.close()
-            try:
-                history = json.loads(fdata, "utf-8")
-            except TypeError:
-                history = json.loads(fdata)
-    except Exception as e:
-        traceback.print_exc()
-
-    return history
-    
-def storesearch(what):
-    if what:
-        size = int(_addon.getSetting('shistory'))
-
-        history = loadsearch()
 
-        if what in history:
-            history.remove(what)
+def choose_suggestion(text):
+    # offer past queries and known titles starting like what was typed, the typed text stays first
+    # - a trigram match is too loose to be worth a second dialog
+    index = search_history.SuggestionIndex(loadsearch())
+    tmdb_api = tmdb_client()
+    if tmdb_api:
+        index.extend(tmdb_api.known_titles())
+    suggestions = [s for s in index.suggest(text, SUGGESTIONS, fuzzy=False) if s != text]
+    if not suggestions:
+        return text
+    choice = xbmcgui.Dialog().select(_addon.getLocalizedString(30007), [text] + suggestions)
+    if choice < 0:
+        return None
+    return ([text] + suggestions)[choice]
 
-        history = [what] + history
-        
-        if len(history)>size:
-            history = history[:size]
+def menu_suggestions(history):
+    # known titles close to the recent searches that were not searched for yet
+    tmdb_api = tmdb_client()
+    if not tmdb_api or _addon.getSetting('ssuggest') != 'true':
+        return []
+    index = search_history.SuggestionIndex(tmdb_api.known_titles())
+    seen = set(search_history.normalize(what) for what in history)
+    suggestions = []
+    for what in history:
+        for title in index.suggest(what, SUGGESTIONS):
+            key = search_history.normalize(title)
+            if key not in seen:
+                seen.add(key)
+                suggestions.append(title)
+        if len(suggestions) >= SUGGESTIONS:
+            break
+    return suggestions[:SUGGESTIONS]
 
+def search_log():
+    # one history per invocation, the log is read only once
+    global _search_log
+    if _search_log is None:
         try:
-            with io.open(os.path.join(_profile, SEARCH_HISTORY), 'w', encoding='utf8') as file:
-                try:
-                    data = json.dumps(history).decode('utf8')
-                except AttributeError:
-                    data = json.dumps(history)
-                file.write(data)
-                file.close()
+            if not os.path.exists(_profile):
+                os.makedirs(_profile)
         except Exception as e:
             traceback.print_exc()
+        _search_log = search_history.SearchHistory(_profile, getnumber('shistory', 20))
+    return _search_log
+
+def loadsearch():
+    return search_log().entries()
+    
+def storesearch(what):
+    if what:
+        search_log().add(what)
 
 def removesearch(what):
     if what:
-        history = loadsearch()
-        if what in history:
-            history.remove(what)
-            try:
-                with io.open(os.path.join(_profile, SEARCH_HISTORY), 'w', encoding='utf8') as file:
-                    try:
-                        data = json.dumps(history).decode('utf8')
-                    except AttributeError:
-                        data = json.dumps(history)
-                    file.write(data)
-                    file.close()
-            except Exception as e:
-                traceback.print_exc()
+        search_log().remove(what)
 
 # def dosearch(token, what, category, sort, limit, offset, action):
 #     # Get TMDb API instance if enabled
@@ -368,16 +439,54 @@ def removesearch(what):
 #     else:
 #         popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
 
+def search_variant(token, variant, priority, category, sort, limit):
+    reader = ResponseReader(stream_search({
+        'what': variant, 
+        'category': category, 
+        'sort': sort, 
+        'limit': limit,
+        'offset': 0,  # Always start from 0 for variants
+        'wst': token, 
+        'maybe_removed': 'true'
+    }, timeout=VARIANT_TIMEOUT))
+    return reader, list(tag_variant(reader, variant, priority))
+
+def tag_variant(files, variant, priority):
+    for item in files:
+        # Add search source info for debugging
+        item.search_variant = variant
+        item.search_priority = priority
+        yield item
+
+def dedupe(files):
+    """Drop repeated idents - files arrive in search_priority order, so the higher priority one wins"""
+    seen = set()
+    for item in files:
+        if item.ident not in seen:
+            seen.add(item.ident)
+            yield item
+
+def carry_params(what, category, sort, limit, offset):
+    # the results a ranked page did not show are kept in the search cache for the following page
+    return {'what': what, 'category': category, 'sort': sort, 'limit': limit, 'offset': offset, 'carry': 1}
+
+def carried(what, category, sort, limit, offset):
+    if offset == 0:
+        return []
+    content, age = _search_cache.get(carry_params(what, category, sort, limit, offset))
+    if content is None or age > CARRY_TTL:
+        return []
+    return ResponseReader(content).read()
+
 def dosearch(token, what, category, sort, limit, offset, action):
     # Add debugging logs
     xbmc.log(f"YaWSP: Starting search for '{what}', category='{category}', offset={offset}", level=xbmc.LOGINFO)
     
     # Get TMDb API instance if enabled
-    tmdb_api = None
-    if _addon.getSetting('tmdb_enable') == 'true':
-        tmdb_api = tmdb.TMDbAPI(_addon, _profile)
+    tmdb_api = tmdb_client()
 
     all_files = []
+    reader = None
 
     # If TMDb is enabled and this is a new search (offset=0), try enhanced queries
     if tmdb_api and offset == 0 and what != NONE_WHAT:
@@ -392,39 +501,40 @@ def dosearch(token, what, category, sort, limit, offset, action):
             search_variants = [what, what.upper(), what.title()]
             xbmc.log(f"YaWSP: Using manual search variants: {search_variants}", level=xbmc.LOGINFO)
         
-        # Try each search variant
-        for i, variant in enumerate(search_variants[:3]):  # Limit to top 3 variants
+        # Run the top variants in parallel, a slow variant is dropped after VARIANT_TIMEOUT
+        search_variants = search_variants[:SEARCH_VARIANTS]
+        executor = ThreadPoolExecutor(max_workers=len(search_variants))
+        futures = []
+        for i, variant in enumerate(search_variants):
             xbmc.log(f"YaWSP: Searching variant {i+1}: '{variant}'", level=xbmc.LOGINFO)
-            
-            response = api('search', {
-                'what': variant, 
-                'category': category, 
-                'sort': sort, 
-                'limit': limit if i == 0 else min(limit, 50),  # Fewer results for variants
-                'offset': 0,  # Always start from 0 for variants
-                'wst': token, 
-                'maybe_removed': 'true'
-            })
-            
-            xml = ET.fromstring(response.content)
-            if is_ok(xml):
-                result_count = 0
-                for file in xml.iter('file'):
-                    item = todict(file)
-                    # Add search source info for debugging
-                    item['search_variant'] = variant
-                    item['search_priority'] = i
-                    all_files.append(item)
-                    result_count += 1
-                
-                xbmc.log(f"YaWSP: Variant '{variant}' returned {result_count} results", level=xbmc.LOGINFO)
+            futures.append(executor.submit(search_variant, token, variant, i, category, sort,
+                                           limit if i == 0 else min(limit, 50)))  # Fewer results for variants
+        done, _ = wait(futures, timeout=VARIANT_TIMEOUT)
+        executor.shutdown(wait=False)
+        
+        # Merge in search_priority order so the listing does not depend on which variant finished first
+        for variant, future in zip(search_variants, futures):
+            if future not in done:
+                xbmc.log(f"YaWSP: Variant '{variant}' timed out", level=xbmc.LOGWARNING)
+                continue
+            try:
+                variant_reader, files = future.result()
+            except Exception as e:
+                xbmc.log(f"YaWSP: Variant '{variant}' failed: {str(e)}", level=xbmc.LOGWARNING)
+                continue
+            if variant_reader.ok:
+                # The first successful variant in priority order provides the paging total
+                if reader is None:
+                    reader = variant_reader
+                all_files.extend(files)
+                xbmc.log(f"YaWSP: Variant '{variant}' returned {len(files)} results", level=xbmc.LOGINFO)
             else:
                 xbmc.log(f"YaWSP: Variant '{variant}' failed", level=xbmc.LOGWARNING)
     else:
         xbmc.log(f"YaWSP: Using standard search for '{what}'", level=xbmc.LOGINFO)
         
         # Fallback to original single search
-        response = api('search', {
+        reader = ResponseReader(stream_search({
             'what': '' if what == NONE_WHAT else what, 
             'category': category, 
             'sort': sort, 
@@ -432,33 +542,16 @@ def dosearch(token, what, category, sort, limit, offset, action):
             'offset': offset, 
             'wst': token, 
             'maybe_removed': 'true'
-        })
-        
-        xml = ET.fromstring(response.content)
-        if is_ok(xml):
-            for file in xml.iter('file'):
-                item = todict(file)
-                item['search_variant'] = what
-                item['search_priority'] = 0
-                all_files.append(item)
+        }))
+        all_files = tag_variant(reader, what, 0)
+
+    # Records stream from the parser through deduplication into ranking,
+    # the results the previous page left over compete for this one
+    files = dedupe(itertools.chain(all_files, carried(what, category, sort, limit, offset)))
+    rest = []
 
     # Process results only if we have a valid XML response
-    if is_ok(xml):
-        xbmc.log(f"YaWSP: Total raw results: {len(all_files)}", level=xbmc.LOGINFO)
-        
-        # Remove duplicates based on file identifier
-        seen_files = {}
-        for item in all_files:
-            if item['ident'] not in seen_files:
-                seen_files[item['ident']] = item
-            else:
-                # Keep the one with higher priority (lower number)
-                if item['search_priority'] < seen_files[item['ident']]['search_priority']:
-                    seen_files[item['ident']] = item
-        
-        files = list(seen_files.values())
-        xbmc.log(f"YaWSP: After deduplication: {len(files)} results", level=xbmc.LOGINFO)
-        
+    if reader is not None and reader.ok:
         # Only apply custom sorting for video searches
         if category == 'video' or category == '':
             # Get filter settings
@@ -469,9 +562,13 @@ def dosearch(token, what, category, sort, limit, offset, action):
                 'enrich_metadata': _addon.getSetting('tmdb_enable') == 'true'
             }
             
-            # Apply our custom filtering and sorting
-            files = search_ranking.filter_and_sort_results(files, what, filters, tmdb_api)
-            xbmc.log(f"YaWSP: After filtering and ranking: {len(files)} results", level=xbmc.LOGINFO)
+            # Apply our custom filtering and pick the page, the rest moves to the next page unsorted
+            files, rest = search_ranking.select_results(files, limit, what, filters, tmdb_api)
+            _search_cache.put(carry_params(what, category, sort, limit, offset + limit), toresponse(rest))
+            xbmc.log(f"YaWSP: After filtering and ranking: {len(files)} results, {len(rest)} moved to the next page", level=xbmc.LOGINFO)
+            xbmc.log(f"YaWSP: Scoring caches: {search_ranking.cache_stats()}", level=xbmc.LOGDEBUG)
+            if tmdb_api:
+                xbmc.log(f"YaWSP: TMDb requests: {tmdb_api.stats()}", level=xbmc.LOGDEBUG)
         
         # Display pagination (previous page)
         if offset > 0:
@@ -493,18 +590,47 @@ def dosearch(token, what, category, sort, limit, offset, action):
             xbmcplugin.addDirectoryItem(_handle, get_url(action='play',ident=item['ident'],name=item['name']), listitem, False)
         
         # Display pagination (next page)
-        try:
-            total = int(xml.find('total').text)
-        except:
-            total = 0
-            
-        if offset + limit < total:
+        total = reader.total
+        if offset + limit < total or rest:
             listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30207))
             listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
             xbmcplugin.addDirectoryItem(_handle, get_url(action=action, what=what, category=category, sort=sort, limit=limit, offset=offset+limit), listitem, True)
+            return total
     else:
         xbmc.log("YaWSP: Search failed - no valid XML response", level=xbmc.LOGWARNING)
         popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+    return None
+
+def prefetch(token, what, category, sort, limit, offset, total):
+    """Load the pages following offset into the search cache, so next page renders from local data"""
+    depth = getnumber('sprefetch')
+    budget = getnumber('sprefetch_kb') * 1024
+    if depth <= 0 or budget <= 0 or not _search_cache.enabled:
+        return
+    
+    for page_offset in range(offset + limit, min(total, offset + limit * (depth + 1)), limit):
+        data = {
+            'what': '' if what == NONE_WHAT else what, 
+            'category': category, 
+            'sort': sort, 
+            'limit': limit, 
+            'offset': page_offset, 
+            'wst': token, 
+            'maybe_removed': 'true'
+        }
+        content, age = _search_cache.get(data)
+        if content is not None and age < _search_cache.ttl:
+            continue
+        try:
+            content = api('search', data, timeout=VARIANT_TIMEOUT).content
+        except Exception as e:
+            xbmc.log(f"YaWSP: Prefetch of offset {page_offset} failed: {str(e)}", level=xbmc.LOGWARNING)
+            return
+        _search_cache.put(data, content)
+        xbmc.log(f"YaWSP: Prefetched offset {page_offset} ({len(content)} bytes)", level=xbmc.LOGDEBUG)
+        budget -= len(content)
+        if budget <= 0:
+            return
 
 # Add a new function to create list items with TMDb metadata
 def create_tmdb_listitem(file, addcommands=[]):
@@ -533,10 +659,10 @@ def create_tmdb_listitem(file, addcommands=[]):
     # Set artwork
     art = {}
     if tmdb_data.get('poster_path'):
-        art['poster'] = tmdb_data['poster_path']
-        art['thumb'] = tmdb_data['poster_path']
+        art['poster'] = artwork(tmdb_data['poster_path'])
+        art['thumb'] = art['poster']
     if tmdb_data.get('backdrop_path'):
-        art['fanart'] = tmdb_data['backdrop_path']
+        art['fanart'] = artwork(tmdb_data['backdrop_path'])
     
     if art:
         listitem.setArt(art)
@@ -585,12 +711,13 @@ def search(params):
     if 'ask' in params:
         slast = _addon.getSetting('slast')
         if slast != what:
-            what = ask(what)
+            what = ask(what, suggest=True)
             if what is not None:
                 storesearch(what)
             else:
                 updateListing=True
 
+    total = None
     if what is not None:
         if 'offset' not in params:
             _addon.setSetting('slast',what)
@@ -602,7 +729,7 @@ def search(params):
         sort = params['sort'] if 'sort' in params else SORTS[int(_addon.getSetting('ssort'))]
         limit = int(params['limit']) if 'limit' in params else int(_addon.getSetting('slimit'))
         offset = int(params['offset']) if 'offset' in params else 0
-        dosearch(token, what, category, sort, limit, offset, 'search')
+        total = dosearch(token, what, category, sort, limit, offset, 'search')
     else:
         _addon.setSetting('slast',NONE_WHAT)
         history = loadsearch()
@@ -627,7 +754,20 @@ def search(params):
             commands.append(( _addon.getLocalizedString(30213), 'Container.Update(' + get_url(action='search',remove=search) + ')'))
             listitem.addContextMenuItems(commands)
             xbmcplugin.addDirectoryItem(_handle, get_url(action='search',what=search,ask=1), listitem, True)
+        
+        for suggestion in menu_suggestions(history):
+            listitem = xbmcgui.ListItem(label='[I]' + suggestion + '[/I]')
+            listitem.setArt({'icon': 'DefaultMovieTitle.png'})
+            xbmcplugin.addDirectoryItem(_handle, get_url(action='search',what=suggestion,ask=1), listitem, True)
     xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
+    
+    # The listing is already shown, store its missing artwork for the next time
+    if _artwork_cache:
+        _artwork_cache.download_pending()
+    
+    # The listing is already shown, fetch the next page while the user looks at it
+    if total:
+        prefetch(token, what, category, sort, limit, offset, total)
 
 def queue(params):
     xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \ " + _addon.getLocalizedString(30202))
@@ -643,11 +783,9 @@ def queue(params):
             popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
         updateListing=True
     
-    response = api('queue',{'wst':token})
-    xml = ET.fromstring(response.content)
-    if is_ok(xml):
-        for file in xml.iter('file'):
-            item = todict(file)
+    reader = ResponseReader(api_stream('queue',{'wst':token}))
+    if reader.ok:
+        for item in reader:
             commands = []
             commands.append(( _addon.getLocalizedString(30215), 'Container.Update(' + get_url(action='queue',dequeue=item['ident']) + ')'))
             listitem = tolistitem(item,commands)
@@ -672,13 +810,12 @@ def history(params):
     if 'remove' in params:
         remove = params['remove']
         updateListing=True
-        response = api('history',{'wst':token})
-        xml = ET.fromstring(response.content)
+        reader = ResponseReader(api_stream('history',{'wst':token}))
         ids = []
-        if is_ok(xml):
-            for file in xml.iter('file'):
-                if remove == file.find('ident').text:
-                    ids.append(file.find('download_id').text)
+        if reader.ok:
+            for file in reader:
+                if remove == file['ident']:
+                    ids.append(file['download_id'])
         else:
             popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
         if ids:
@@ -693,13 +830,13 @@ def history(params):
         toqueue(params['toqueue'],token)
         updateListing=True
     
-    response = api('history',{'wst':token})
-    xml = ET.fromstring(response.content)
+    reader = ResponseReader(api_stream('history',{'wst':token}), ['ended_at', 'download_id', 'started_at'])
     files = []
-    if is_ok(xml):
-        for file in xml.iter('file'):
-            item = todict(file, ['ended_at', 'download_id', 'started_at'])
-            if item not in files:
+    if reader.ok:
+        seen = set()
+        for item in reader:
+            if item.ident not in seen:
+                seen.add(item.ident)
                 files.append(item)
         for file in files:
             commands = []
@@ -779,7 +916,7 @@ def info(params):
         text += infonize(info, 'removed', lambda x:'Yes' if x=='1' else 'No')
         xbmcgui.Dialog().textviewer(_addon.getAddonInfo('name'), text)
 
-def getlink(ident,wst,dtype='video_stream'):
+def getlink(ident,wst,dtype='video_stream',notify=True):
     #uuid experiment
     duuid = _addon.getSetting('duuid')
     if not duuid:
@@ -796,12 +933,20 @@ def getlink(ident,wst,dtype='video_stream'):
     if is_ok(xml):
         return xml.find('link').text
     else:
-        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        if notify:
+            popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
         return None
 
 def play(params):
     token = revalidate()
-    link = getlink(params['ident'],token)
+    # series episodes carry other files of the same episode to fall back to
+    alternates = [ident for ident in params.get('alt', '').split(',') if ident]
+    link = getlink(params['ident'],token,notify=not alternates)
+    for i, ident in enumerate(alternates):
+        if link is not None:
+            break
+        xbmc.log(f"YaWSP: Playing alternate file {ident} instead of {params['ident']}", level=xbmc.LOGINFO)
+        link = getlink(ident,token,notify=i == len(alternates) - 1)
     if link is not None:
         #headers experiment
         headers = _session.headers
@@ -984,15 +1129,18 @@ def series_search(params):
         return
     
     # Initialize SeriesManager and perform search
-    sm = series_manager.SeriesManager(_addon, _profile)
+    sm = series_manager.SeriesManager(_addon, _profile, _search_cache, tmdb_client())
     
     # Show progress dialog
     progress = xbmcgui.DialogProgress()
     progress.create('YaWSP', f'Vyhledavam serial {series_name}...')
     
+    def update_progress(done, total):
+        progress.update(int(done * 100 / total), f'Vyhledavam serial {series_name}... ({done}/{total})')
+    
     try:
         # Search for the series
-        series_data = sm.search_series(series_name, api, token)
+        series_data = sm.search_series(series_name, api, token, update_progress)
         
         if not series_data or not series_data['seasons']:
             progress.close()
@@ -1042,15 +1190,16 @@ def series_refresh(params):
     series_name = params['series_name']
     
     # Initialize SeriesManager and perform search
-    sm = series_manager.SeriesManager(_addon, _profile)
+    sm = series_manager.SeriesManager(_addon, _profile, tmdb_api=tmdb_client())
     
     # Show progress dialog
     progress = xbmcgui.DialogProgress()
     progress.create('YaWSP', f'Aktualizuji data pro serial {series_name}...')
     
     try:
-        # Search for the series
-        series_data = sm.search_series(series_name, api, token)
+        # Only files newer than the last scan are read
+        series_data, added = sm.refresh_series(series_name, api, token,
+                                               lambda done, total: progress.update(int(done * 100 / total)))
         
         if not series_data or not series_data['seasons']:
             progress.close()
@@ -1060,7 +1209,7 @@ def series_refresh(params):
         
         # Success
         progress.close()
-        popinfo(f'Aktualizovano: {sum(len(season) for season in series_data["seasons"].values())} epizod v {len(series_data["seasons"])} sezonach')
+        popinfo(f'Aktualizovano: {added} novych, {sum(len(season) for season in series_data["seasons"].values())} epizod v {len(series_data["seasons"])} sezonach')
         
         # Redirect to series detail to refresh the view
         xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')